@@ -0,0 +1,276 @@
+"""
+Benchmarks for the simulation and data loading hot paths. Runs offline on the
+bundled data/ files and reports wall time, throughput and peak memory.
+
+    python benchmarks.py --output bench_results.json
+    python benchmarks.py --compare bench_results.json
+    python benchmarks.py --variance
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+import jit_kernels
+import preprocessing_data
+from postseason_sim import SAMPLERS, SimSeries, SimSeriesAll, series_win_pcts, sim_series
+
+
+# A fixed matchup from the bundled data: the 1986 Finals
+TEAM1 = "Boston Celtics"
+TEAM2 = "Houston Rockets"
+YEAR = 1986
+SEED = 2020
+
+# Fixed game win probabilities for team1 at home and on the road, so the
+# series benchmark times only the series stage
+TEAM1_HOME_WIN_PCT = 0.65
+TEAM1_ROAD_WIN_PCT = 0.45
+
+ITERATION_COUNTS = [1000, 5000, 15000]
+
+# name -> (function(iters) returning the units it simulated, unit name, uses iters)
+BENCHMARKS = {}
+
+
+def benchmark(name, unit, uses_iters=True):
+    def register(func):
+        BENCHMARKS[name] = (func, unit, uses_iters)
+        return func
+    return register
+
+
+def _series(iters, backend="numpy"):
+    return SimSeries(TEAM1, TEAM2, YEAR, game_iters=iters, series_iters=iters,
+                     seed=SEED, backend=backend)
+
+
+@benchmark("SimSeries.execute", "series")
+def bench_execute(iters):
+    _series(iters).execute()
+    return iters
+
+
+@benchmark("SimSeries._sim_game", "games")
+def bench_sim_game(iters):
+    _series(iters)._sim_game(home=TEAM1, visitor=TEAM2)
+    return iters
+
+
+@benchmark("sim_series", "series")
+def bench_sim_series(iters):
+    team1_win_pct = series_win_pcts(TEAM1_HOME_WIN_PCT, TEAM1_ROAD_WIN_PCT, 7)
+    sim_series(team1_win_pct, iters, np.random.default_rng(SEED))
+    return iters
+
+
+@benchmark("join_games_splits (cold)", "rows", uses_iters=False)
+def bench_join_cold(iters):
+    preprocessing_data.clear_data_cache()
+    return preprocessing_data.join_games_splits().shape[0]
+
+
+@benchmark("join_games_splits (warm)", "rows", uses_iters=False)
+def bench_join_warm(iters):
+    return preprocessing_data.join_games_splits().shape[0]
+
+
+@benchmark("SimSeriesAll.execute (Finals)", "series")
+def bench_execute_all(iters):
+    sim_all = SimSeriesAll(sim_round="Finals", seed=SEED, game_iters=iters,
+                           series_iters=iters)
+    sim_all.execute()
+    return sim_all.series_df.shape[0]
+
+
+@benchmark("SimSeriesAll.execute (Finals, batch)", "series")
+def bench_execute_all_batch(iters):
+    sim_all = SimSeriesAll(sim_round="Finals", seed=SEED, game_iters=iters,
+                           series_iters=iters, batch=True)
+    sim_all.execute()
+    return sim_all.series_df.shape[0]
+
+
+# The numba backend draws the same numbers, so these time only the compiled
+# loops against the numpy ones. Registered only when numba is installed
+if jit_kernels.numba is not None:
+    @benchmark("SimSeries.execute (numba)", "series")
+    def bench_execute_numba(iters):
+        _series(iters, "numba").execute()
+        return iters
+
+    @benchmark("SimSeriesAll.execute (Finals, numba)", "series")
+    def bench_execute_all_numba(iters):
+        sim_all = SimSeriesAll(sim_round="Finals", seed=SEED, game_iters=iters,
+                               series_iters=iters, backend="numba")
+        sim_all.execute()
+        return sim_all.series_df.shape[0]
+
+    @benchmark("SimSeriesAll.execute (Finals, batch, numba)", "series")
+    def bench_execute_all_batch_numba(iters):
+        sim_all = SimSeriesAll(sim_round="Finals", seed=SEED, game_iters=iters,
+                               series_iters=iters, batch=True, backend="numba")
+        sim_all.execute()
+        return sim_all.series_df.shape[0]
+
+
+def _time(func, iters, repeat):
+    """
+    Returns the best wall time of repeat runs and the units simulated per run,
+    after one untimed warm-up run that pays for numba compilation and any
+    other first-call costs
+    """
+    func(iters)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        units = func(iters)
+        times.append(time.perf_counter() - start)
+    return min(times), units
+
+
+def _peak_memory(func, iters):
+    """
+    Returns the peak traced allocation in bytes during one run
+    """
+    tracemalloc.start()
+    func(iters)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names=None, iteration_counts=ITERATION_COUNTS, repeat=3):
+    """
+    Runs the benchmarks and returns a dict of results that can be saved as json
+    """
+    # Load the data once so only the cold join benchmark pays for it
+    preprocessing_data.join_games_splits()
+    preprocessing_data.season_weights()
+
+    results = []
+    for name, (func, unit, uses_iters) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+
+        for iters in (iteration_counts if uses_iters else [None]):
+            seconds, units = _time(func, iters, repeat)
+            peak = _peak_memory(func, iters)
+            result = {"name": name, "iters": iters, "seconds": seconds,
+                      "unit": unit, "throughput": units / seconds,
+                      "peak_memory_mb": peak / 2 ** 20}
+            results.append(result)
+            print(f"{name:44} iters={str(iters):>6} {seconds * 1000:10.2f} ms "
+                  f"{result['throughput']:14,.0f} {unit}/s "
+                  f"{result['peak_memory_mb']:8.2f} MB")
+
+    return {"commit": _commit(), "python": platform.python_version(),
+            "numpy": np.__version__, "results": results}
+
+
+def compare(current, baseline, threshold=0.1):
+    """
+    Prints the change in wall time against a baseline run and returns the
+    benchmarks that got slower by more than threshold
+    """
+    baseline_times = {(r["name"], r["iters"]): r["seconds"] for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        key = (result["name"], result["iters"])
+        if key not in baseline_times:
+            continue
+
+        change = result["seconds"] / baseline_times[key] - 1
+        flag = "REGRESSION" if change > threshold else ""
+        print(f"{result['name']:44} iters={str(result['iters']):>6} {change:+8.1%} {flag}")
+        if change > threshold:
+            regressions.append(key)
+
+    return regressions
+
+
+def variance_per_sample(iters=1000, reps=200):
+    """
+    Runs the fixed matchup reps times for every sampler, with and without
+    common random numbers, and returns the variance of team1's home game win
+    probability and of winner_pct, each multiplied by the samples used, with
+    the efficiency gain over independent sampling. A gain of 2 means the
+    sampler reaches the same accuracy with half the iterations
+    """
+    results = []
+    for sampler in SAMPLERS:
+        for common_random_numbers in [False, True]:
+            seeds = np.random.SeedSequence(SEED).spawn(reps)
+            game_pcts = []
+            winner_pcts = []
+            start = time.perf_counter()
+            for seed in seeds:
+                sim = SimSeries(TEAM1, TEAM2, YEAR, game_iters=iters, series_iters=iters,
+                                seed=seed, sampler=sampler,
+                                common_random_numbers=common_random_numbers)
+                team1_win_pct = sim._team1_win_pcts()
+                game_pcts.append(team1_win_pct[0])
+                sim.result_table = sim_series(team1_win_pct, iters, sim.rng, sampler)
+                winner_pcts.append(sim.result_table[0].sum() / iters)
+            seconds = (time.perf_counter() - start) / reps
+
+            results.append({"sampler": sampler,
+                            "common_random_numbers": common_random_numbers,
+                            "game_variance": np.var(game_pcts, ddof=1) * iters,
+                            "series_variance": np.var(winner_pcts, ddof=1) * iters,
+                            "seconds": seconds})
+
+    baseline = results[0]
+    for result in results:
+        result["game_gain"] = baseline["game_variance"] / result["game_variance"]
+        result["series_gain"] = baseline["series_variance"] / result["series_variance"]
+        print(f"{result['sampler']:12} crn={str(result['common_random_numbers']):5} "
+              f"game var/sample {result['game_variance']:.4f} ({result['game_gain']:.2f}x) "
+              f"series var/sample {result['series_variance']:.4f} ({result['series_gain']:.2f}x) "
+              f"{result['seconds'] * 1000:8.2f} ms")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--output", help="save results as json to this path")
+    parser.add_argument("--compare", help="compare against a saved json run")
+    parser.add_argument("--iters", type=int, nargs="+", default=ITERATION_COUNTS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="benchmark names to run")
+    parser.add_argument("--variance", action="store_true",
+                        help="compare variance per sample of the samplers instead")
+    args = parser.parse_args()
+
+    if args.variance:
+        variance_per_sample(args.iters[0])
+        return
+
+    current = run_benchmarks(args.only, args.iters, args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(current, baseline):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
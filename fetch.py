@@ -0,0 +1,158 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class Fetcher:
+    """
+    Shared HTTP layer for the scrapers. Requests go through one pooled,
+    keep-alive session, at most max_concurrency are in flight at once, each
+    host gets at most requests_per_minute, and throttled or failed requests
+    are retried with exponential backoff.
+
+    Responses are cached on disk under cache_dir, keyed by a hash of the URL.
+    A cached page younger than max_age seconds is served as is, an older one
+    is revalidated with its ETag / Last-Modified, and in offline mode every
+    page must come from the cache
+    """
+    def __init__(self, max_concurrency=8, requests_per_minute=20, retries=5,
+                 backoff_factor=2, timeout=30, cache_dir=".http_cache",
+                 max_age=24 * 60 * 60, offline=False):
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.offline = offline
+        self.min_interval = 60 / requests_per_minute
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.host_next_request = {}  # host -> earliest time of its next request
+        self.lock = threading.Lock()
+
+        retry = Retry(total=retries, backoff_factor=backoff_factor,
+                      status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=["GET"], respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=max_concurrency,
+                              pool_maxsize=max_concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _wait_for_host(self, host):
+        """
+        Reserves the host's next request slot and sleeps until it comes up
+        """
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.host_next_request.get(host, now))
+            self.host_next_request[host] = start + self.min_interval
+        time.sleep(start - now)
+
+    def _cache_path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode()).hexdigest())
+
+    def _read_cache(self, url):
+        """
+        Returns (metadata, body) for a cached url, or (None, None)
+        """
+        path = self._cache_path(url)
+        if not os.path.exists(path + ".json"):
+            return None, None
+
+        with open(path + ".json") as f:
+            meta = json.load(f)
+        with open(path + ".body", "rb") as f:
+            body = f.read()
+        return meta, body
+
+    def _write_cache(self, url, response):
+        path = self._cache_path(url)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta = {"url": url, "fetched_at": time.time(),
+                "encoding": response.encoding,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified")}
+
+        # Write to temporary files and rename so readers never see half a page
+        tmp = f".{threading.get_ident()}.tmp"
+        with open(path + ".body" + tmp, "wb") as f:
+            f.write(response.content)
+        with open(path + ".json" + tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".body" + tmp, path + ".body")
+        os.replace(path + ".json" + tmp, path + ".json")
+
+    def _touch_cache(self, url, meta):
+        meta["fetched_at"] = time.time()
+        path = self._cache_path(url)
+        tmp = f".{threading.get_ident()}.tmp"
+        with open(path + ".json" + tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".json" + tmp, path + ".json")
+
+    def get(self, url):
+        meta, body = self._read_cache(url)
+
+        if meta is not None and (self.offline or
+                                 time.time() - meta["fetched_at"] < self.max_age):
+            return _cached_response(url, meta, body)
+
+        if self.offline:
+            raise LookupError(f"{url} is not in the cache and fetching is offline")
+
+        headers = {}
+        if meta is not None and meta["etag"]:
+            headers["If-None-Match"] = meta["etag"]
+        if meta is not None and meta["last_modified"]:
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        with self.slots:
+            self._wait_for_host(urlsplit(url).netloc)
+            response = self.session.get(url, timeout=self.timeout, headers=headers)
+
+        if response.status_code == 304 and meta is not None:
+            self._touch_cache(url, meta)
+            return _cached_response(url, meta, body)
+
+        response.raise_for_status()
+        self._write_cache(url, response)
+        return response
+
+
+def _cached_response(url, meta, body):
+    """
+    Rebuilds a requests.Response from a cached page
+    """
+    response = requests.Response()
+    response.url = url
+    response.status_code = 200
+    response.encoding = meta["encoding"]
+    response._content = body
+    return response
+
+
+# Fetcher shared by every scraper in the process. SCRAPE_OFFLINE=1 replays
+# pages from the cache without touching the network
+fetcher = Fetcher(offline=os.environ.get("SCRAPE_OFFLINE") == "1")
+
+
+def get(url):
+    """
+    Fetches url through the shared Fetcher and returns the response
+    """
+    return fetcher.get(url)
+
+
+@functools.lru_cache(maxsize=None)
+def get_season_page(yr):
+    """
+    Returns the html of basketball-reference's NBA_{yr}.html season page.
+    The page is fetched once per process and shared by every parser that needs it
+    """
+    return get(f"https://www.basketball-reference.com/leagues/NBA_{yr}.html").content
@@ -0,0 +1,93 @@
+import csv
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+
+# Counters divided by a phase's time to give a rate: rate -> (counter, phase)
+RATES = {"games_per_second": ("games", "game_sim"),
+         "series_per_second": ("series", "series_sim")}
+
+
+class Profiler:
+    """
+    Opt-in instrumentation for simulation runs. Records wall time and call
+    counts per phase (data loading, joins, weight fitting, game and series
+    simulation) and named counters such as iterations and RNG draws.
+    callback, if given, is called with (phase, seconds) as each phase ends
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds[name] += elapsed
+            self.calls[name] += 1
+            if self.callback is not None:
+                self.callback(name, elapsed)
+
+    def count(self, name, n=1):
+        self.counters[name] += int(n)
+
+    def merge(self, report):
+        """
+        Adds a report from another profiler, e.g. one run in a worker process
+        """
+        for name, phase in report["phases"].items():
+            self.seconds[name] += phase["seconds"]
+            self.calls[name] += phase["calls"]
+        for name, n in report["counters"].items():
+            self.counters[name] += n
+
+    def report(self):
+        rates = {rate: self.counters[counter] / self.seconds[phase]
+                 for rate, (counter, phase) in RATES.items()
+                 if self.seconds.get(phase) and counter in self.counters}
+        return {"phases": {name: {"seconds": self.seconds[name], "calls": self.calls[name]}
+                           for name in self.seconds},
+                "counters": dict(self.counters),
+                "rates": rates}
+
+    def to_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def to_csv(self, path):
+        report = self.report()
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["kind", "name", "value", "calls"])
+            for name, phase in report["phases"].items():
+                writer.writerow(["phase", name, phase["seconds"], phase["calls"]])
+            for name, n in report["counters"].items():
+                writer.writerow(["counter", name, n, ""])
+            for name, rate in report["rates"].items():
+                writer.writerow(["rate", name, rate, ""])
+
+
+class NullProfiler:
+    """
+    Stand-in used when instrumentation is off. Every method is a no-op
+    """
+    _phase = nullcontext()
+
+    def phase(self, name):
+        return self._phase
+
+    def count(self, name, n=1):
+        pass
+
+    def merge(self, report):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,114 @@
+"""
+Numba compiled kernels for the simulation loops. The random draws are always
+made by NumPy's Generator and passed in, so a seeded run gives the same
+results on either backend; only the scoring and the series stopping logic
+are compiled
+"""
+try:
+    import numba
+except ImportError:
+    numba = None
+
+import numpy as np
+
+
+BACKENDS = ["numpy", "numba"]
+
+
+def check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}")
+
+    if backend == "numba" and numba is None:
+        raise ImportError("The numba backend needs numba installed")
+
+
+def _jit(func):
+    return numba.njit(cache=True)(func) if numba is not None else func
+
+
+@_jit
+def count_wins(home_draws, visitor_draws, off_weight, def_weight):
+    """
+    Scores every game from (6 x games) arrays of made shots, in the order
+    sim_score draws them: the team's 3s, 2s and free throws, then the 3s, 2s
+    and free throws its opponent allows. Returns (home wins, ties)
+    """
+    home_wins = 0
+    ties = 0
+    for game in range(home_draws.shape[1]):
+        home_score = ((off_weight * (3 * home_draws[0, game] + 2 * home_draws[1, game] + home_draws[2, game])) +
+                      (def_weight * (3 * home_draws[3, game] + 2 * home_draws[4, game] + home_draws[5, game])))
+        visitor_score = ((off_weight * (3 * visitor_draws[0, game] + 2 * visitor_draws[1, game] + visitor_draws[2, game])) +
+                         (def_weight * (3 * visitor_draws[3, game] + 2 * visitor_draws[4, game] + visitor_draws[5, game])))
+
+        if home_score > visitor_score:
+            home_wins += 1
+        elif home_score == visitor_score:
+            ties += 1
+
+    return home_wins, ties
+
+
+@_jit
+def tabulate_series(team1_win, wins_needed):
+    """
+    Plays out every row of a (series x games) array of team1 game wins until
+    a team clinches. Returns the (winner x games) count table, row 0 being
+    team1
+    """
+    result_table = np.zeros((2, team1_win.shape[1] + 1), dtype=np.int64)
+    for series in range(team1_win.shape[0]):
+        team1_wins = 0
+        team2_wins = 0
+        for game in range(team1_win.shape[1]):
+            if team1_win[series, game]:
+                team1_wins += 1
+            else:
+                team2_wins += 1
+
+            if team1_wins == wins_needed:
+                result_table[0, game + 1] += 1
+                break
+            if team2_wins == wins_needed:
+                result_table[1, game + 1] += 1
+                break
+
+    return result_table
+
+
+@_jit
+def tabulate_series_batch(team1_win, wins_needed):
+    """
+    tabulate_series for a (matchups x series x games) array, with each
+    matchup's wins_needed. Returns a (matchups x winner x games) count table
+    """
+    result_tables = np.zeros((team1_win.shape[0], 2, team1_win.shape[2] + 1), dtype=np.int64)
+    for matchup in range(team1_win.shape[0]):
+        result_tables[matchup] = tabulate_series(team1_win[matchup], wins_needed[matchup])
+    return result_tables
+
+
+@_jit
+def count_wins_batch(home_made, visitor_made, off_weights, def_weights):
+    """
+    count_wins for (rows x 6 x games) arrays of each team's HOME_RATES draws,
+    as sim_games_batch draws them. Returns arrays of home wins and ties
+    """
+    home_wins = np.zeros(home_made.shape[0], dtype=np.int64)
+    ties = np.zeros(home_made.shape[0], dtype=np.int64)
+    for row in range(home_made.shape[0]):
+        off_weight = off_weights[row]
+        def_weight = def_weights[row]
+        for game in range(home_made.shape[2]):
+            home_score = ((off_weight * (3 * home_made[row, 0, game] + 2 * home_made[row, 1, game] + home_made[row, 2, game])) +
+                          (def_weight * (3 * visitor_made[row, 3, game] + 2 * visitor_made[row, 4, game] + visitor_made[row, 5, game])))
+            visitor_score = ((off_weight * (3 * visitor_made[row, 0, game] + 2 * visitor_made[row, 1, game] + visitor_made[row, 2, game])) +
+                             (def_weight * (3 * home_made[row, 3, game] + 2 * home_made[row, 4, game] + home_made[row, 5, game])))
+
+            if home_score > visitor_score:
+                home_wins[row] += 1
+            elif home_score == visitor_score:
+                ties[row] += 1
+
+    return home_wins, ties
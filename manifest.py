@@ -0,0 +1,106 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+
+MANIFEST_PATH = "scrape_manifest.json"
+
+# Serialises manifest writes across every Manifest in the process
+_manifest_lock = threading.Lock()
+
+# One lock per output file so concurrent workers never interleave upserts
+_file_locks = {}
+_file_locks_lock = threading.Lock()
+
+
+def current_season():
+    """
+    Returns the season still in progress, named by the year it ends in
+    """
+    today = datetime.date.today()
+    return today.year + 1 if today.month >= 10 else today.year
+
+
+def content_hash(content):
+    """
+    Returns a hash of a page or table so changed units can be told apart
+    """
+    if isinstance(content, pd.DataFrame):
+        content = content.to_csv(index=False)
+    if isinstance(content, str):
+        content = content.encode()
+    return hashlib.sha256(content).hexdigest()
+
+
+class Manifest:
+    """
+    Records which (source, season, unit) pieces of a scrape are complete, so
+    a refresh only fetches units that are new, changed or still in progress.
+    Entries store the content hash of what was written for the unit.
+    Several scrapers may each hold a Manifest on the same file, so writes
+    merge into what is on disk rather than replacing it
+    """
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.entries = self._read()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def _key(source, season, unit=None):
+        return f"{source}/{season}" if unit is None else f"{source}/{season}/{unit}"
+
+    def is_complete(self, source, season, unit=None):
+        """
+        A unit is complete once it has been written for a finished season.
+        Units of the current season are always refetched
+        """
+        return (season < current_season() and
+                self._key(source, season, unit) in self.entries)
+
+    def is_changed(self, source, season, content, unit=None):
+        entry = self.entries.get(self._key(source, season, unit))
+        return entry is None or entry["hash"] != content_hash(content)
+
+    def mark_complete(self, source, season, content, unit=None):
+        entry = {"hash": content_hash(content),
+                 "completed_at": datetime.datetime.now().isoformat()}
+        with _manifest_lock:
+            self.entries = self._read()
+            self.entries[self._key(source, season, unit)] = entry
+
+            with open(self.path + ".tmp", "w") as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(self.path + ".tmp", self.path)
+
+
+def _file_lock(path):
+    with _file_locks_lock:
+        return _file_locks.setdefault(path, threading.Lock())
+
+
+def upsert_csv(path, df, key_cols):
+    """
+    Writes df into the csv at path, replacing every existing row whose
+    key_cols values appear in df. Rerunning a unit therefore never adds
+    duplicates. Rows are kept sorted by key_cols (stable within a key) and
+    the file is rewritten atomically
+    """
+    with _file_lock(path):
+        if os.path.exists(path):
+            existing = pd.read_csv(path)
+            new_keys = pd.MultiIndex.from_frame(df[key_cols].astype(existing[key_cols].dtypes.to_dict()))
+            replaced = pd.MultiIndex.from_frame(existing[key_cols]).isin(new_keys)
+            df = pd.concat([existing.loc[~replaced], df], ignore_index=True)
+
+        df = df.drop_duplicates().sort_values(key_cols, kind="stable")
+        df.to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
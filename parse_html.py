@@ -0,0 +1,77 @@
+import lxml.html
+import numpy as np
+import pandas as pd
+
+
+def parse_page(html):
+    """
+    Parses a page once with lxml's C parser. Every lookup on the page then
+    works on the returned tree instead of re-parsing the html
+    """
+    return lxml.html.fromstring(html)
+
+
+def find_table(doc, container_id=None, index=0):
+    """
+    Returns the index-th table inside the element with id container_id, or
+    inside the whole page. basketball-reference ships most of its tables
+    inside HTML comments, so when the container holds no table element the
+    comments inside it are parsed as well
+    """
+    container = doc if container_id is None else doc.get_element_by_id(container_id)
+    tables = container.xpath(".//table")
+
+    if not tables:
+        for comment in container.xpath(".//comment()"):
+            if "<table" in comment.text:
+                fragment = lxml.html.fromstring(comment.text)
+                tables.extend(fragment.xpath("descendant-or-self::table"))
+
+    return tables[index]
+
+
+def _row_cells(row):
+    """
+    Returns the text of every cell in a row, repeating cells that span
+    several columns so the row lines up with the header
+    """
+    cells = []
+    for cell in row.xpath("./th|./td"):
+        cells.extend([cell.text_content().strip()] * int(cell.get("colspan", 1)))
+    return cells
+
+
+def table_to_df(table):
+    """
+    Builds a DataFrame straight from a table element. The last header row
+    names the columns (a leading row of th cells does when there is no
+    thead), every body row becomes a row, empty cells become NaN and numeric
+    columns are converted
+    """
+    body_rows = table.xpath("./tbody/tr") or table.xpath("./tr")
+    rows = [_row_cells(row) for row in body_rows]
+
+    header_rows = table.xpath("./thead/tr")
+    if header_rows:
+        columns = _row_cells(header_rows[-1])
+
+    elif body_rows and not body_rows[0].xpath("./td"):
+        columns = rows.pop(0)
+
+    else:
+        columns = []
+
+    width = max([len(columns)] + [len(row) for row in rows])
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    columns = columns + [""] * (width - len(columns))
+    columns = [col if col else f"Unnamed: {idx}" for idx, col in enumerate(columns)]
+
+    df = pd.DataFrame(rows, columns=range(width)).replace("", np.nan)
+    for idx in df.columns:
+        try:
+            df[idx] = pd.to_numeric(df[idx])
+        except (ValueError, TypeError):
+            pass
+
+    df.columns = columns
+    return df
@@ -1,20 +1,519 @@
 from preprocessing_data import *
-import statsmodels.api as sm
+from concurrent.futures import ProcessPoolExecutor
+import zlib
+from instrumentation import NULL_PROFILER, Profiler
+import jit_kernels
 import numpy as np
 
+# Games hosted by the higher seed in the 2-2-1-1-1 (and 2-2-1) format
+HOME_GAMES = [1, 2, 5, 7]
+
+# Bumped whenever a change to the simulation changes its results, so cached
+# results from the previous model are not reused
+MODEL_VERSION = 1
+
+# z value of the two-sided 95% normal interval used for simulation errors
+CI_Z = 1.96
+
+SAMPLERS = ["independent", "antithetic", "stratified"]
+
+# Rows of a game's uniforms, in the order sim_game_uniforms reads the rates
+HOME_RATES = ["fg3", "fg2", "ft", "opp_fg3", "opp_fg2", "opp_ft"]
+
+
+def sim_score(off_stats, def_stats, off_weight, def_weight, size, rng):
+    """
+    Simulates size weighted scores for the offense in off_stats against the
+    defense in def_stats. Every made shot count is drawn as an array so the
+    whole batch of games is scored in one pass
+    """
+    off_score = (3 * rng.poisson(off_stats["fg3"], size)) + \
+                (2 * rng.poisson(off_stats["fg2"], size)) + \
+                rng.poisson(off_stats["ft"], size)
+    def_score = (3 * rng.poisson(def_stats["opp_fg3"], size)) + \
+                (2 * rng.poisson(def_stats["opp_fg2"], size)) + \
+                 rng.poisson(def_stats["opp_ft"], size)
+    weighted_score = (off_weight * off_score) + (def_weight * def_score)
+    return weighted_score
+
+
+def draw_uniforms(dims, size, rng, sampler="independent"):
+    """
+    Returns a (dims x size) array of uniforms for driving size samples of a
+    dims dimensional draw. "antithetic" pairs every draw u with 1 - u and
+    "stratified" is a latin hypercube, one draw in each of size equal strata
+    of every dimension
+    """
+    if sampler == "independent":
+        return rng.random((dims, size))
+
+    elif sampler == "antithetic":
+        half = rng.random((dims, -(-size // 2)))
+        return np.concatenate([half, 1 - half], axis=1)[:, :size]
+
+    elif sampler == "stratified":
+        strata = rng.permuted(np.tile(np.arange(size), (dims, 1)), axis=1)
+        return (strata + rng.random((dims, size))) / size
+
+    else:
+        raise ValueError(f"Unknown sampler {sampler}")
+
+
+def poisson_pmf(lam):
+    """
+    Returns the Poisson pmf on 0 .. k_max, with k_max far enough into the
+    tail that the mass left out is negligible
+    """
+    k_max = int(lam + 12 * np.sqrt(lam) + 20)
+    return np.cumprod(np.concatenate([[np.exp(-lam)], lam / np.arange(1, k_max + 1)]))
+
+
+def poisson_ppf(u, lam):
+    """
+    Inverse Poisson CDF, by a lookup in the CDF table, so Poisson draws can be
+    driven by the uniforms from draw_uniforms
+    """
+    pmf = poisson_pmf(lam)
+    return np.minimum(np.searchsorted(np.cumsum(pmf), u), len(pmf) - 1)
+
+
+def points_pmf(fg3, fg2, ft):
+    """
+    Returns the pmf of 3 * Poisson(fg3) + 2 * Poisson(fg2) + Poisson(ft) on
+    0, 1, 2 ... points, by convolving the three made shot distributions
+    """
+    pmf = np.array([1.0])
+    for points, lam in [(3, fg3), (2, fg2), (1, ft)]:
+        made = poisson_pmf(lam)
+        spread = np.zeros(points * (len(made) - 1) + 1)
+        spread[::points] = made
+        pmf = np.convolve(pmf, spread)
+    return pmf
+
+
+def difference_pmf(pmf_a, pmf_b):
+    """
+    Returns (values, pmf) of A - B for independent A and B given as pmfs on
+    0, 1, 2 ..., trimmed to the values with non-negligible mass
+    """
+    pmf = np.convolve(pmf_a, pmf_b[::-1])
+    values = np.arange(len(pmf)) - (len(pmf_b) - 1)
+    keep = pmf > 1e-15
+    return values[keep], pmf[keep]
+
+
+def game_win_prob(home_stats, visitor_stats, off_weight, def_weight):
+    """
+    Returns the exact probability that the home team wins, with ties counted
+    as half a win like sim_game's coin flip
+    """
+    return win_prob_from_pmfs(points_pmf(home_stats["fg3"], home_stats["fg2"], home_stats["ft"]),
+                              points_pmf(home_stats["opp_fg3"], home_stats["opp_fg2"], home_stats["opp_ft"]),
+                              points_pmf(visitor_stats["fg3"], visitor_stats["fg2"], visitor_stats["ft"]),
+                              points_pmf(visitor_stats["opp_fg3"], visitor_stats["opp_fg2"], visitor_stats["opp_ft"]),
+                              off_weight, def_weight)
+
+
+def win_prob_from_pmfs(home_off, home_def, visitor_off, visitor_def,
+                       off_weight, def_weight):
+    """
+    Returns the home win probability from the points_pmf of each team's own
+    makes (off) and of the makes it allows (def). The weighted score
+    difference is off_weight * S + def_weight * T, where S is home minus
+    visitor points from their own makes and T is the points the visitor
+    allows minus the points the home team allows. For each value of S the
+    home team wins when T is above -off_weight * S / def_weight, so the sum
+    over the joint pmf is a lookup in the tail sums of T's pmf
+    """
+    s_values, s_pmf = difference_pmf(home_off, visitor_off)
+    t_values, t_pmf = difference_pmf(visitor_def, home_def)
+
+    if def_weight < 0:
+        t_values, t_pmf, def_weight = -t_values[::-1], t_pmf[::-1], -def_weight
+
+    threshold = -off_weight * s_values / def_weight
+    tolerance = 1e-9 / def_weight
+    tail = np.concatenate([np.cumsum(t_pmf[::-1])[::-1], [0]])
+    above = tail[np.searchsorted(t_values, threshold + tolerance, side="right")]
+    tie = tail[np.searchsorted(t_values, threshold - tolerance, side="left")] - above
+    return s_pmf @ (above + 0.5 * tie)
+
+
+def sim_game_uniforms(home_stats, visitor_stats, off_weight, def_weight, u):
+    """
+    Simulates one game per column of u, a (12 x games) array of uniforms:
+    rows 0-5 drive the home team's HOME_RATES and rows 6-11 the visitor's.
+    Ties count as half a win, the expectation of sim_game's coin flip.
+    Returns the fraction won by the home team
+    """
+    home_made = [poisson_ppf(u[row], home_stats[stat]) for row, stat in enumerate(HOME_RATES)]
+    visitor_made = [poisson_ppf(u[row + 6], visitor_stats[stat]) for row, stat in enumerate(HOME_RATES)]
+
+    # Each team's points are its makes plus the makes the other team allows
+    home_score = (off_weight * (3 * home_made[0] + 2 * home_made[1] + home_made[2]) +
+                  def_weight * (3 * visitor_made[3] + 2 * visitor_made[4] + visitor_made[5]))
+    visitor_score = (off_weight * (3 * visitor_made[0] + 2 * visitor_made[1] + visitor_made[2]) +
+                     def_weight * (3 * home_made[3] + 2 * home_made[4] + home_made[5]))
+
+    return np.mean(home_score > visitor_score) + 0.5 * np.mean(home_score == visitor_score)
+
+
+def score_draws(off_stats, def_stats, size, rng):
+    """
+    Draws the six made shot counts of size scores in the same order as
+    sim_score and returns them as a (6 x size) array
+    """
+    return np.stack([rng.poisson(off_stats["fg3"], size), rng.poisson(off_stats["fg2"], size),
+                     rng.poisson(off_stats["ft"], size), rng.poisson(def_stats["opp_fg3"], size),
+                     rng.poisson(def_stats["opp_fg2"], size), rng.poisson(def_stats["opp_ft"], size)])
+
+
+def sim_game(home_stats, visitor_stats, off_weight, def_weight, game_iters, rng,
+             sampler="independent", backend="numpy"):
+    """
+    Simulates game_iters games and returns the fraction won by the home team.
+    Any sampler other than "independent" draws through sim_game_uniforms.
+    The "numba" backend scores the same draws in a compiled loop
+    """
+    if sampler != "independent":
+        return sim_game_uniforms(home_stats, visitor_stats, off_weight, def_weight,
+                                 draw_uniforms(12, game_iters, rng, sampler))
+
+    if backend == "numba":
+        home_wins, ties = jit_kernels.count_wins(
+            score_draws(home_stats, visitor_stats, game_iters, rng),
+            score_draws(visitor_stats, home_stats, game_iters, rng),
+            off_weight, def_weight)
+
+    else:
+        home_score = sim_score(home_stats, visitor_stats, off_weight, def_weight,
+                               game_iters, rng)
+        visitor_score = sim_score(visitor_stats, home_stats, off_weight, def_weight,
+                                  game_iters, rng)
+
+        home_wins = np.count_nonzero(home_score > visitor_score)
+        ties = np.count_nonzero(home_score == visitor_score)
+
+    # if a tie, choose a random winner
+    home_wins += np.count_nonzero(rng.binomial(1, 0.5, ties) == 0)
+
+    home_win_pct = home_wins / game_iters
+    return home_win_pct
+
+
+def ci_half_width(pct, n):
+    """
+    Returns the half-width of the 95% Wilson score interval of a proportion
+    pct estimated from n samples. Unlike the normal approximation it stays
+    above zero when pct is 0 or 1, so a lopsided matchup isn't reported as
+    exact after one batch
+    """
+    z2 = CI_Z ** 2
+    return CI_Z / (1 + z2 / n) * np.sqrt(pct * (1 - pct) / n + z2 / (4 * n ** 2))
+
+
+def sim_game_adaptive(home_stats, visitor_stats, off_weight, def_weight,
+                      tolerance, batch_size, max_iters, rng, sampler="independent",
+                      backend="numpy"):
+    """
+    Simulates games in batches of batch_size until the confidence interval
+    half-width of the home win fraction is at most tolerance, or max_iters
+    games have been played. Returns (home_win_pct, half_width, games played)
+    """
+    home_wins = 0
+    game_iters = 0
+    while game_iters < max_iters:
+        size = min(batch_size, max_iters - game_iters)
+        home_wins += sim_game(home_stats, visitor_stats, off_weight,
+                              def_weight, size, rng, sampler, backend) * size
+        game_iters += size
+
+        half_width = ci_half_width(home_wins / game_iters, game_iters)
+        if half_width <= tolerance:
+            break
+
+    return home_wins / game_iters, half_width, game_iters
+
+
+def series_win_pcts(team1_home_win_pct, team1_visitor_win_pct, num_games):
+    """
+    Returns team1's win probability for each game of the series
+    """
+    game_nums = np.arange(1, num_games + 1)
+    team1_win_pct = np.where(np.isin(game_nums, HOME_GAMES),
+                             team1_home_win_pct, team1_visitor_win_pct)
+    return team1_win_pct
+
+
+def sim_series(team1_win_pct, series_iters, rng, sampler="independent",
+               backend="numpy"):
+    """
+    Simulates series_iters series at once as a (series x game) win matrix.
+    Each series stops at the first game where either team reaches the wins
+    needed. Returns the (winner x games) count table, row 0 being team1.
+    The "numba" backend plays out the same win matrix in a compiled loop
+    """
+    num_games = len(team1_win_pct)
+    wins_needed = num_games // 2 + 1
+    game_nums = np.arange(1, num_games + 1)
+
+    if sampler == "independent":
+        team1_win = rng.binomial(1, team1_win_pct, (series_iters, num_games))
+    else:
+        team1_win = draw_uniforms(num_games, series_iters, rng, sampler).T < team1_win_pct
+
+    if backend == "numba":
+        return jit_kernels.tabulate_series(team1_win, wins_needed)
+
+    team1_game_wins = np.cumsum(team1_win, axis=1)
+    team2_game_wins = game_nums - team1_game_wins
+
+    # Games played is the first game where either team clinches the series
+    finished = (team1_game_wins == wins_needed) | (team2_game_wins == wins_needed)
+    games = np.argmax(finished, axis=1) + 1
+    team2_won = team2_game_wins[np.arange(series_iters), games - 1] == wins_needed
+
+    result_table = np.bincount(team2_won * (num_games + 1) + games,
+                               minlength=2 * (num_games + 1))
+    return result_table.reshape(2, num_games + 1)
+
+
+def sim_series_adaptive(team1_win_pct, tolerance, batch_size, max_iters, rng,
+                        sampler="independent", backend="numpy"):
+    """
+    Simulates series in batches of batch_size until the confidence interval
+    half-width of the favourite's series win fraction is at most tolerance,
+    or max_iters series have been played. Returns the count table
+    """
+    result_table = 0
+    series_iters = 0
+    while series_iters < max_iters:
+        size = min(batch_size, max_iters - series_iters)
+        result_table = result_table + sim_series(team1_win_pct, size, rng, sampler, backend)
+        series_iters += size
+
+        winner_pct = result_table.sum(axis=1).max() / series_iters
+        if ci_half_width(winner_pct, series_iters) <= tolerance:
+            break
+
+    return result_table
+
+
+def exact_series(team1_win_pct):
+    """
+    Computes the exact probability of every (winner, games) outcome by walking
+    the distribution over (team1 wins, team2 wins) states game by game.
+    Returns a (winner x games) table of probabilities, row 0 being team1
+    """
+    num_games = len(team1_win_pct)
+    wins_needed = num_games // 2 + 1
+    result_table = np.zeros((2, num_games + 1))
+
+    # state[i, j] is the probability the series is unfinished at i-j
+    state = np.zeros((wins_needed, wins_needed))
+    state[0, 0] = 1
+
+    for game, p in enumerate(team1_win_pct, start=1):
+        next_state = np.zeros((wins_needed + 1, wins_needed + 1))
+        next_state[1:, :-1] += state * p
+        next_state[:-1, 1:] += state * (1 - p)
+
+        result_table[0, game] = next_state[wins_needed, :].sum()
+        result_table[1, game] = next_state[:, wins_needed].sum()
+        state = next_state[:wins_needed, :wins_needed]
+
+    return result_table
+
+
+def sim_games_batch(home_rates, visitor_rates, off_weights, def_weights,
+                    game_iters, rng, backend="numpy"):
+    """
+    Simulates game_iters games for every row of home_rates and visitor_rates,
+    (games x 6) arrays of HOME_RATES, in one pass. off_weights and def_weights
+    hold each row's season weights. Returns each row's home win fraction, with
+    ties broken by a coin flip as in sim_game
+    """
+    points = np.array([3, 2, 1])
+    home_made = rng.poisson(home_rates[:, :, None], home_rates.shape + (game_iters,))
+    visitor_made = rng.poisson(visitor_rates[:, :, None], visitor_rates.shape + (game_iters,))
+
+    if backend == "numba":
+        home_wins, ties = jit_kernels.count_wins_batch(home_made, visitor_made,
+                                                       off_weights, def_weights)
+
+    else:
+        home_score = ((off_weights[:, None] * np.einsum("k,gki->gi", points, home_made[:, :3])) +
+                      (def_weights[:, None] * np.einsum("k,gki->gi", points, visitor_made[:, 3:])))
+        visitor_score = ((off_weights[:, None] * np.einsum("k,gki->gi", points, visitor_made[:, :3])) +
+                         (def_weights[:, None] * np.einsum("k,gki->gi", points, home_made[:, 3:])))
+
+        home_wins = np.count_nonzero(home_score > visitor_score, axis=1)
+        ties = np.count_nonzero(home_score == visitor_score, axis=1)
+    return (home_wins + rng.binomial(ties, 0.5)) / game_iters
+
+
+def sim_series_batch(team1_win_pct, wins_needed, series_iters, rng, backend="numpy"):
+    """
+    Simulates series_iters series for every row of team1_win_pct, a
+    (series x games) array padded to the longest series, as one
+    (series x iterations x games) win array. wins_needed holds each row's
+    wins to clinch. Returns a (series x winner x games) count table
+    """
+    num_series, max_games = team1_win_pct.shape
+    game_nums = np.arange(1, max_games + 1)
+    wins_needed = wins_needed[:, None, None]
+
+    team1_win = rng.random((num_series, series_iters, max_games)) < team1_win_pct[:, None, :]
+    if backend == "numba":
+        return jit_kernels.tabulate_series_batch(team1_win, wins_needed[:, 0, 0])
+
+    team1_game_wins = np.cumsum(team1_win, axis=2)
+    team2_game_wins = game_nums - team1_game_wins
+
+    finished = (team1_game_wins == wins_needed) | (team2_game_wins == wins_needed)
+    games = np.argmax(finished, axis=2) + 1
+    team2_won = np.take_along_axis(team2_game_wins, games[:, :, None] - 1,
+                                   axis=2)[:, :, 0] == wins_needed[:, :, 0]
+
+    cells = 2 * (max_games + 1)
+    outcome = (np.arange(num_series)[:, None] * cells) + (team2_won * (max_games + 1)) + games
+    result_tables = np.bincount(outcome.ravel(), minlength=num_series * cells)
+    return result_tables.reshape(num_series, 2, max_games + 1)
+
+
+# Cache of season matchup matrices: (year, game_iters, seed, game_method) -> DataFrame
+_matchup_matrices = {}
+
+
+def sim_points(rates, size, rng):
+    """
+    Simulates size point totals for every row of rates, a (teams x 3) array
+    of 3 pointers, 2 pointers and free throws made. Returns (teams x size)
+    """
+    rates = np.asarray(rates, dtype=float)
+    made = rng.poisson(rates[:, :, None], (rates.shape[0], 3, size))
+    return (3 * made[:, 0]) + (2 * made[:, 1]) + made[:, 2]
+
+
+def season_matchup_matrix(year, game_iters=15000, seed=None, game_method="monte_carlo"):
+    """
+    Returns a (home x visitor) DataFrame of the home team's game win
+    probability for every pair of teams in the season. Each team's home and
+    road scoring is simulated once and shared by all of its pairings, so the
+    whole matrix costs four draws per team. With game_method "analytic" the
+    probabilities are exact, from each team's four points pmfs. The matrix's
+    attrs record the game_method and the game_iters behind each entry, 0 for
+    analytic. Matrices are cached per (year, game_iters, seed, game_method),
+    except unseeded Monte Carlo ones, which are drawn afresh on every call
+    """
+    if game_method == "analytic":
+        key = (year, None, None, game_method)
+    else:
+        key = (year, game_iters, seed, game_method) if seed is not None else None
+    if key in _matchup_matrices:
+        return _matchup_matrices[key]
+
+    rng = np.random.default_rng(seed)
+    splits_year = load_splits(columns=SPLIT_KEYS + RATE_COLUMNS, years=[year])
+    home = splits_year.loc[splits_year.split_value == "Home"].set_index("team").sort_index()
+    visitor = splits_year.loc[splits_year.split_value == "Visitor"].set_index("team").loc[home.index]
+    weights = season_weights().loc[year]
+
+    if game_method == "analytic":
+        matrix = _analytic_matrix(home, visitor, weights.off_weight, weights.def_weight)
+
+    elif game_method == "monte_carlo":
+        matrix = _monte_carlo_matrix(home, visitor, weights.off_weight,
+                                     weights.def_weight, game_iters, rng)
+
+    else:
+        raise ValueError(f"Unknown game_method {game_method}")
+
+    np.fill_diagonal(matrix, np.nan)
+    matrix = pd.DataFrame(matrix, index=pd.Index(home.index, name="Home"),
+                          columns=pd.Index(home.index, name="Visitor"))
+    matrix.attrs = {"game_method": game_method,
+                    "game_iters": game_iters if game_method == "monte_carlo" else 0}
+    if key is not None:
+        _matchup_matrices[key] = matrix
+    return matrix
+
+
+def _analytic_matrix(home, visitor, off_weight, def_weight):
+    pmfs = [[points_pmf(*rates) for rates in team_rates.to_numpy()]
+            for team_rates in [home[["fg3", "fg2", "ft"]], home[["opp_fg3", "opp_fg2", "opp_ft"]],
+                               visitor[["fg3", "fg2", "ft"]], visitor[["opp_fg3", "opp_fg2", "opp_ft"]]]]
+    home_off, home_def, visitor_off, visitor_def = pmfs
+
+    matrix = np.empty((home.shape[0], home.shape[0]))
+    for home_idx in range(home.shape[0]):
+        for visitor_idx in range(home.shape[0]):
+            matrix[home_idx, visitor_idx] = win_prob_from_pmfs(
+                home_off[home_idx], home_def[home_idx], visitor_off[visitor_idx],
+                visitor_def[visitor_idx], off_weight, def_weight)
+    return matrix
+
+
+def _monte_carlo_matrix(home, visitor, off_weight, def_weight, game_iters, rng):
+    home_off = sim_points(home[["fg3", "fg2", "ft"]], game_iters, rng)
+    home_def = sim_points(home[["opp_fg3", "opp_fg2", "opp_ft"]], game_iters, rng)
+    visitor_off = sim_points(visitor[["fg3", "fg2", "ft"]], game_iters, rng)
+    visitor_def = sim_points(visitor[["opp_fg3", "opp_fg2", "opp_ft"]], game_iters, rng)
+
+    matrix = np.empty((home.shape[0], home.shape[0]))
+    for home_idx in range(home.shape[0]):
+        home_score = (off_weight * home_off[home_idx]) + (def_weight * visitor_def)
+        visitor_score = (off_weight * visitor_off) + (def_weight * home_def[home_idx])
+
+        # Ties are split evenly, the expectation of the coin flip in sim_game
+        matrix[home_idx] = (np.mean(home_score > visitor_score, axis=1) +
+                            0.5 * np.mean(home_score == visitor_score, axis=1))
+    return matrix
+
 
 class SimSeries:
     def __init__(self, team1, team2, year, num_games=7, game_iters=15000,
-                 series_iters=15000):
+                 series_iters=15000, method="monte_carlo", seed=None,
+                 matchup_matrix=None, tolerance=None, batch_size=1000,
+                 sampler="independent", common_random_numbers=False,
+                 game_method="monte_carlo", backend="numpy", profiler=None):
+        self.profiler = profiler or NULL_PROFILER  # an instrumentation.Profiler to record phases
         self.year = year
         self.team1 = team1  # the higher seed
         self.team2 = team2  # the lower seed
         self.year = year  # the year
         self.num_games = num_games
-        self.game_stats = self._retrieve_game_data()
-        self.stats_year = self._retrieve_splits_data()
+        self.team_index = self._retrieve_team_index()
         self.game_iters = game_iters  # the number of times to simulate each game
         self.series_iters = series_iters  # the number of times to simulate each series
+        self.method = method  # "monte_carlo" samples series, "exact" solves for them
+        self.game_method = game_method  # "monte_carlo" samples games, "analytic" solves for them
+        # "numba" compiles the scoring and series loops, drawing the same
+        # numbers so results match "numpy" for a fixed seed
+        jit_kernels.check_backend(backend)
+        self.backend = backend
+        self.rng = np.random.default_rng(seed)  # seed may be an int or a SeedSequence
+        self.matchup_matrix = matchup_matrix  # optional season_matchup_matrix to index into
+        # With a tolerance, games and series are sampled in batches until the
+        # confidence interval half-width is within it, and game_iters and
+        # series_iters only cap the samples
+        self.tolerance = tolerance
+        self.batch_size = batch_size
+        # Variance reduction: sampler is one of SAMPLERS, and with
+        # common_random_numbers both venues' games are driven by the same
+        # uniforms, each team's scoring using the same draws home and away.
+        # Intervals in game_errors and winner_pct_error assume independent
+        # samples, so they are conservative for the other samplers
+        self.sampler = sampler
+        if common_random_numbers and (tolerance is not None or matchup_matrix is not None or
+                                      game_method != "monte_carlo"):
+            raise ValueError("common_random_numbers does not support tolerance, "
+                             "matchup_matrix or game_method analytic")
+        self.common_random_numbers = common_random_numbers
+        self.game_errors = {}  # (home, visitor) -> half-width of the home win pct
+        self.game_iters_used = {}  # (home, visitor) -> games simulated
+        self.winner_pct_error = 0.0  # half-width of winner_pct, 0 for exact
+        self.series_iters_used = 0
         self.team1_wins = 0
         self.team2_wins = 0
         self.winner = ""
@@ -23,28 +522,43 @@ class SimSeries:
 
 
     def execute(self):
-        self._sim_series()
-        series_results = self.result_df.mode()
-        self.winner = series_results.winner.item()
-        self.winner_pct = (self.result_df.loc[self.result_df.winner == self.winner].shape[0] /
-                           self.result_df.shape[0])
-
-        self.result_counts = self.result_df.copy()
-        self.result_counts.loc[:, "count"] = 1
-        self.result_counts = self.result_counts.groupby(["winner", "games"])["count"].count().reset_index().sort_values("count", ascending=False)
+        if self.method == "exact":
+            self._exact_series()
+
+        elif self.method == "monte_carlo":
+            self._sim_series()
+
+        else:
+            raise ValueError(f"Unknown method {self.method}")
+
+        self._tabulate_results()
+
+    def _tabulate_results(self):
+        """
+        Derives winner, winner_pct and games from result_table, the
+        (winner x games) count table where row 0 is team1 and row 1 is team2
+        """
+        team_wins = self.result_table.sum(axis=1)
+        winner_idx = int(np.argmax(team_wins))
+        self.winner = [self.team1, self.team2][winner_idx]
+        self.winner_pct = team_wins[winner_idx] / team_wins.sum()
+        if self.method == "monte_carlo":
+            self.series_iters_used = int(team_wins.sum())
+            self.winner_pct_error = ci_half_width(self.winner_pct, self.series_iters_used)
+
+        self.result_counts = pd.DataFrame(
+            [{"winner": [self.team1, self.team2][team_idx], "games": games,
+              "count": self.result_table[team_idx, games]}
+             for team_idx in range(2)
+             for games in range(self.num_games + 1)
+             if self.result_table[team_idx, games] > 0])
+        self.result_counts = self.result_counts.sort_values("count", ascending=False)
         self.most_common_result = self.result_counts.head(1)
         self.games = self.most_common_result.games.item()
 
-    def _retrieve_game_data(self):
-        all_year_stats = join_games_splits()
-        games_year = all_year_stats.loc[all_year_stats.YR == self.year]
-        return games_year
-
-    def _retrieve_splits_data(self):
-        splits_data = pd.read_csv("data/Home_Visitor_Splits.csv")
-        splits_data = splits_data.drop_duplicates()
-        stats_year = splits_data.loc[(splits_data.yr == self.year) & ((splits_data.team == self.team1) | (splits_data.team == self.team2))]
-        return stats_year
+    def _retrieve_team_index(self):
+        with self.profiler.phase("load"):
+            return team_index()
 
     def _retrieve_stats(self, team, place):
         """
@@ -57,125 +571,317 @@ class SimSeries:
         the teams free throws allowed
         returns a dictionary with the above items
         """
-        stat_dict = {}
-        team_stats = self.stats_year.loc[(self.stats_year.team == team) & (self.stats_year.split_value == place)]
-        stat_dict["fg3"] = team_stats.fg3.item()
-        stat_dict["fg2"] = team_stats.fg2.item()
-        stat_dict["ft"] = team_stats.ft.item()
-        stat_dict["opp_fg3"] = team_stats.opp_fg3.item()
-        stat_dict["opp_fg2"] = team_stats.opp_fg2.item()
-        stat_dict["opp_ft"] = team_stats.opp_ft.item()
-
-        return stat_dict
+        return self.team_index.stats(self.year, team, place)
 
     def _calc_weight(self):
         """
-        Calculates the weights, off_weight and def_weight, for the given season and sets them.
+        Looks up the weights, off_weight and def_weight, for the given season and sets them.
         Function is a setter
         """
-        visitor_score_vs_ppg = self.game_stats.loc[
-            self.game_stats.Playoffs == 0, ["Visitor_Pts", "pts_visitor",
-                                            "opp_pts_home"]]
-        home_score_vs_ppg = self.game_stats.loc[
-            self.game_stats.Playoffs == 0, ["Home_Pts", "pts_home", "opp_pts_visitor"]]
-
-        visitor_score_vs_ppg.columns = ["Score", "PTS", "Opp_PTS"]
-        home_score_vs_ppg.columns = ["Score", "PTS", "Opp_PTS"]
-
-        combined_score_vs_ppg = pd.concat(
-            [visitor_score_vs_ppg, home_score_vs_ppg])
-
-        X = combined_score_vs_ppg.loc[:, ["PTS", "Opp_PTS"]].to_numpy()
-        Y = combined_score_vs_ppg.loc[:, "Score"].to_numpy()
-        Y = Y.reshape(-1, 1)
-
-        model = sm.OLS(Y, X)
-        results = model.fit()
-
-        self.off_weight = results.params[0]
-        self.def_weight = results.params[1]
+        with self.profiler.phase("weights"):
+            weights = season_weights().loc[self.year]
+        self.off_weight = weights.off_weight
+        self.def_weight = weights.def_weight
 
     def _sim_score(self, off_stats, def_stats):
-        off_score = (3 * np.random.poisson(off_stats["fg3"])) + \
-                    (2 * np.random.poisson(off_stats["fg2"])) + \
-                    np.random.poisson(off_stats["ft"])
-        def_score = (3 * np.random.poisson(def_stats["opp_fg3"])) + \
-                    (2 * np.random.poisson(def_stats["opp_fg2"])) + \
-                     np.random.poisson(def_stats["opp_ft"])
-        weighted_score = (self.off_weight * off_score) + (self.def_weight * def_score)
-        return weighted_score
+        return sim_score(off_stats, def_stats, self.off_weight, self.def_weight,
+                         self.game_iters, self.rng)
 
     def _sim_game(self, home, visitor):
+        if self.matchup_matrix is not None:
+            # The error comes from how the matrix was built, not this series'
+            # settings
+            win_pct = self.matchup_matrix.loc[home, visitor]
+            exact = self.matchup_matrix.attrs["game_method"] == "analytic"
+            game_iters = self.matchup_matrix.attrs["game_iters"]
+            self.game_errors[(home, visitor)] = 0.0 if exact else ci_half_width(win_pct, game_iters)
+            self.game_iters_used[(home, visitor)] = game_iters
+            return win_pct
+
         home_stats = self._retrieve_stats(home, "Home")
         visitor_stats = self._retrieve_stats(visitor, "Visitor")
         self._calc_weight()
 
-        home_wins = 0
-        visitor_wins = 0
+        with self.profiler.phase("game_sim"):
+            if self.game_method == "analytic":
+                win_pct = game_win_prob(home_stats, visitor_stats, self.off_weight,
+                                        self.def_weight)
+                game_iters = 0
+                half_width = 0.0
 
-        for _ in range(self.game_iters):
-            home_score = self._sim_score(off_stats=home_stats, def_stats=visitor_stats)
-            visitor_score = self._sim_score(off_stats=visitor_stats, def_stats=home_stats)
+            elif self.game_method != "monte_carlo":
+                raise ValueError(f"Unknown game_method {self.game_method}")
 
-            if home_score > visitor_score:
-                home_wins += 1
+            elif self.tolerance is None:
+                win_pct = sim_game(home_stats, visitor_stats, self.off_weight,
+                                   self.def_weight, self.game_iters, self.rng,
+                                   self.sampler, self.backend)
+                game_iters = self.game_iters
+                half_width = ci_half_width(win_pct, game_iters)
 
-            elif visitor_score > home_score:
-                visitor_wins += 1
+            else:
+                win_pct, half_width, game_iters = sim_game_adaptive(
+                    home_stats, visitor_stats, self.off_weight, self.def_weight,
+                    self.tolerance, self.batch_size, self.game_iters, self.rng,
+                    self.sampler, self.backend)
 
-            elif home_score == visitor_score:
-                # if a tie, choose a random winner
-                coin_flip = np.random.binomial(1, 0.5)
-                if coin_flip == 0:
-                    home_wins += 1
+        self._record_game(home, visitor, half_width, game_iters)
+        return win_pct
 
-                elif coin_flip == 1:
-                    visitor_wins += 1
+    def _sim_venues_common(self):
+        """
+        Simulates team1's home and road games from one array of uniforms, so
+        team1's scoring draws at home are reused on the road and likewise for
+        team2. Returns team1's home and road win probabilities
+        """
+        team1_home = self._retrieve_stats(self.team1, "Home")
+        team2_visitor = self._retrieve_stats(self.team2, "Visitor")
+        team2_home = self._retrieve_stats(self.team2, "Home")
+        team1_visitor = self._retrieve_stats(self.team1, "Visitor")
+        self._calc_weight()
 
-        home_win_pct = home_wins / (home_wins + visitor_wins)
-        return home_win_pct
+        with self.profiler.phase("game_sim"):
+            u = draw_uniforms(12, self.game_iters, self.rng, self.sampler)
+            team1_home_win_pct = sim_game_uniforms(team1_home, team2_visitor,
+                                                   self.off_weight, self.def_weight, u)
+            # Swap the halves so team1 keeps its rows as the visitor
+            team1_visitor_win_pct = 1 - sim_game_uniforms(team2_home, team1_visitor,
+                                                           self.off_weight, self.def_weight,
+                                                           u[np.r_[6:12, 0:6]])
+
+        self._record_game(self.team1, self.team2,
+                          ci_half_width(team1_home_win_pct, self.game_iters), self.game_iters)
+        self._record_game(self.team2, self.team1,
+                          ci_half_width(team1_visitor_win_pct, self.game_iters), self.game_iters)
+        return team1_home_win_pct, team1_visitor_win_pct
+
+    def _record_game(self, home, visitor, half_width, game_iters):
+        self.game_errors[(home, visitor)] = half_width
+        self.game_iters_used[(home, visitor)] = game_iters
+        self.profiler.count("games", game_iters)
+        # Six draws for each team's score, plus no more than one coin flip per game for ties
+        self.profiler.count("rng_draws", 12 * game_iters)
+
+    def _team1_win_pcts(self):
+        """
+        Simulates team1's chance of winning at home and on the road and returns
+        team1's win probability for each game of the series
+        """
+        if self.common_random_numbers:
+            team1_home_win_pct, team1_visitor_win_pct = self._sim_venues_common()
+
+        else:
+            team1_home_win_pct = self._sim_game(home=self.team1, visitor=self.team2)
+            team1_visitor_win_pct = 1 - self._sim_game(home=self.team2,
+                                                       visitor=self.team1)
+
+        return series_win_pcts(team1_home_win_pct, team1_visitor_win_pct,
+                               self.num_games)
 
     def _sim_series(self):
+        team1_win_pcts = self._team1_win_pcts()
+        with self.profiler.phase("series_sim"):
+            if self.tolerance is None:
+                self.result_table = sim_series(team1_win_pcts, self.series_iters,
+                                               self.rng, self.sampler, self.backend)
+            else:
+                self.result_table = sim_series_adaptive(team1_win_pcts, self.tolerance,
+                                                        self.batch_size, self.series_iters,
+                                                        self.rng, self.sampler, self.backend)
+        series_iters = int(self.result_table.sum())
+        self.profiler.count("series", series_iters)
+        self.profiler.count("rng_draws", series_iters * self.num_games)
+
+    def _exact_series(self):
+        team1_win_pcts = self._team1_win_pcts()
+        with self.profiler.phase("series_sim"):
+            # result_table holds probabilities instead of counts
+            self.result_table = exact_series(team1_win_pcts)
+
+
+class SimSeriesBatch:
+    """
+    Simulates many matchups, given as (year, team1, team2, num_games) with
+    team1 holding home court, in a single array computation: every matchup's
+    home and road games are drawn in one pass, then every series in another.
+    results holds one row per matchup
+    """
+    def __init__(self, matchups, game_iters=15000, series_iters=15000,
+                 method="monte_carlo", game_method="monte_carlo", seed=None,
+                 backend="numpy", profiler=None):
+        self.profiler = profiler or NULL_PROFILER  # an instrumentation.Profiler to record phases
+        self.results = pd.DataFrame(list(matchups),
+                                    columns=["year", "team1", "team2", "num_games"])
+        self.game_iters = game_iters
+        self.series_iters = series_iters
+        self.method = method  # see SimSeries
+        self.game_method = game_method  # see SimSeries
+        jit_kernels.check_backend(backend)
+        self.backend = backend  # see SimSeries
+        self.rng = np.random.default_rng(seed)
 
-        self.result_df = pd.DataFrame()
-        team1_home_win_pct = self._sim_game(home=self.team1, visitor=self.team2)
-        team1_visitor_win_pct = 1 - self._sim_game(home=self.team2,
-                                                   visitor=self.team1)
+    def execute(self):
+        team1_home_win_pct, team1_visitor_win_pct = self._sim_games()
+        self.results.loc[:, "team1_home_win_pct"] = team1_home_win_pct
+        self.results.loc[:, "team1_visitor_win_pct"] = team1_visitor_win_pct
 
-        for _ in range(self.series_iters):
-            team1_game_wins = 0
-            team2_game_wins = 0
-            games = 1
+        max_games = self.results.num_games.max()
+        home_game = np.isin(np.arange(1, max_games + 1), HOME_GAMES)
+        team1_win_pct = np.where(home_game, team1_home_win_pct[:, None],
+                                 team1_visitor_win_pct[:, None])
 
-            while True:
-                if games in [1, 2, 5, 7]:
-                    team1_win = np.random.binomial(1, team1_home_win_pct)
+        with self.profiler.phase("series_sim"):
+            if self.method == "exact":
+                self.result_tables = self._exact_series(team1_win_pct)
 
-                elif games in [3, 4, 6]:
-                    team1_win = np.random.binomial(1, team1_visitor_win_pct)
+            elif self.method == "monte_carlo":
+                wins_needed = self.results.num_games.to_numpy() // 2 + 1
+                self.result_tables = sim_series_batch(team1_win_pct, wins_needed,
+                                                      self.series_iters, self.rng,
+                                                      self.backend)
+                self.profiler.count("series", self.series_iters * self.results.shape[0])
+                self.profiler.count("rng_draws", self.series_iters * max_games * self.results.shape[0])
 
-                if team1_win == 1:
-                    team1_game_wins += 1
+            else:
+                raise ValueError(f"Unknown method {self.method}")
 
-                elif team1_win == 0:
-                    team2_game_wins += 1
+        self._tabulate_results()
 
-                if (team1_game_wins == 4 or team2_game_wins == 4) and self.num_games == 7:
-                    break
+    def _retrieve_rates(self):
+        """
+        Returns (team1 home, team2 visitor, team2 home, team1 visitor), each a
+        (matchups x 6) array of HOME_RATES
+        """
+        with self.profiler.phase("load"):
+            index = team_index()
 
-                elif (team1_game_wins == 3 or team2_game_wins == 3) and self.num_games == 5:
-                    break
+        return [index.lookup(self.results.year, self.results[team], place)
+                for team, place in [("team1", "Home"), ("team2", "Visitor"),
+                                    ("team2", "Home"), ("team1", "Visitor")]]
 
-                games += 1
+    def _sim_games(self):
+        """
+        Simulates every matchup's games at both venues and returns team1's
+        home and road win probabilities
+        """
+        team1_home, team2_visitor, team2_home, team1_visitor = self._retrieve_rates()
+        with self.profiler.phase("weights"):
+            weights = season_weights().loc[self.results.year]
+        off_weights = np.tile(weights.off_weight.to_numpy(), 2)
+        def_weights = np.tile(weights.def_weight.to_numpy(), 2)
+
+        # Rows are every matchup at team1's venue followed by every matchup at team2's
+        home_rates = np.concatenate([team1_home, team2_home])
+        visitor_rates = np.concatenate([team2_visitor, team1_visitor])
+
+        with self.profiler.phase("game_sim"):
+            if self.game_method == "analytic":
+                home_win_pct = np.array([
+                    game_win_prob(dict(zip(HOME_RATES, home)), dict(zip(HOME_RATES, visitor)),
+                                  off_weight, def_weight)
+                    for home, visitor, off_weight, def_weight
+                    in zip(home_rates, visitor_rates, off_weights, def_weights)])
+
+            elif self.game_method == "monte_carlo":
+                home_win_pct = sim_games_batch(home_rates, visitor_rates, off_weights,
+                                               def_weights, self.game_iters, self.rng,
+                                               self.backend)
+                self.profiler.count("games", self.game_iters * home_rates.shape[0])
+                self.profiler.count("rng_draws", 12 * self.game_iters * home_rates.shape[0])
+
+            else:
+                raise ValueError(f"Unknown game_method {self.game_method}")
 
-            iter_winner = self.team1 if team1_game_wins > team2_game_wins else self.team2
-            self.result_df = self.result_df.append({"winner": iter_winner, "games": games}, ignore_index=True)
+        num_matchups = self.results.shape[0]
+        return home_win_pct[:num_matchups], 1 - home_win_pct[num_matchups:]
+
+    def _exact_series(self, team1_win_pct):
+        result_tables = np.zeros((team1_win_pct.shape[0], 2, team1_win_pct.shape[1] + 1))
+        for idx, num_games in enumerate(self.results.num_games):
+            result_tables[idx, :, :num_games + 1] = exact_series(team1_win_pct[idx, :num_games])
+        return result_tables
+
+    def _tabulate_results(self):
+        """
+        Sets each matchup's winner, winner_pct and most likely number of games
+        from result_tables
+        """
+        team_wins = self.result_tables.sum(axis=2)
+        winner_idx = np.argmax(team_wins, axis=1)
+        outcome = self.result_tables.reshape(self.results.shape[0], -1).argmax(axis=1)
+
+        self.results.loc[:, "winner"] = np.where(winner_idx == 0, self.results.team1,
+                                                 self.results.team2)
+        self.results.loc[:, "winner_pct"] = team_wins.max(axis=1) / team_wins.sum(axis=1)
+        self.results.loc[:, "games"] = outcome % self.result_tables.shape[2]
+        self.results.loc[:, "winner_pct_error"] = (
+            ci_half_width(self.results.winner_pct, self.series_iters)
+            if self.method == "monte_carlo" else 0.0)
+
+
+def _sim_matchup(matchup):
+    """
+    Simulates a single matchup, given as a dict of SimSeries arguments, and
+    returns (winner, winner_pct, winner_pct_error, games, report). Module
+    level so it can be sent to worker processes. report is the matchup's
+    profiler report when profile is set, otherwise None
+    """
+    matchup = dict(matchup)
+    profiler = Profiler() if matchup.pop("profile", False) else None
+    sim = SimSeries(**matchup, profiler=profiler)
+    sim.execute()
+    report = profiler.report() if profiler is not None else None
+    return sim.winner, sim.winner_pct, sim.winner_pct_error, sim.games, report
+
+
+def _sim_batch(batch):
+    """
+    Simulates a batch of matchups, given as a dict of SimSeriesBatch
+    arguments, and returns (results, report) like _sim_matchup
+    """
+    batch = dict(batch)
+    profiler = Profiler() if batch.pop("profile", False) else None
+    sim = SimSeriesBatch(**batch, profiler=profiler)
+    sim.execute()
+    report = profiler.report() if profiler is not None else None
+    return sim.results, report
 
 
 class SimSeriesAll:
-    def __init__(self, sim_round="all"):
+    def __init__(self, sim_round="all", method="monte_carlo", n_jobs=1,
+                 seed=None, game_iters=15000, series_iters=15000, tolerance=None,
+                 sampler="independent", common_random_numbers=False,
+                 game_method="monte_carlo", batch=False, backend="numpy", cache=None,
+                 profiler=None):
+        self.profiler = profiler or NULL_PROFILER  # an instrumentation.Profiler to record phases
         self.sim_round = sim_round
-        self.series_df = join_playoff_standings()
+        self.method = method
+        self.game_iters = game_iters
+        self.series_iters = series_iters
+        self.tolerance = tolerance  # see SimSeries, None runs every iteration
+        self.sampler = sampler  # see SimSeries
+        if common_random_numbers and (tolerance is not None or game_method != "monte_carlo"):
+            raise ValueError("common_random_numbers does not support tolerance "
+                             "or game_method analytic")
+        self.common_random_numbers = common_random_numbers
+        self.game_method = game_method  # see SimSeries
+        # With batch, each season's series run as one SimSeriesBatch, which
+        # has no adaptive or variance reduced sampling
+        self.batch = batch
+        if batch and (tolerance is not None or sampler != "independent" or common_random_numbers):
+            raise ValueError("batch does not support tolerance, sampler or common_random_numbers")
+        jit_kernels.check_backend(backend)
+        self.backend = backend  # see SimSeries
+        # An optional result_cache.ResultCache. Series already simulated with
+        # the same settings are read from it instead of simulated. Needs a
+        # seed, and can't be used with batch, whose results depend on the season
+        if cache is not None and (seed is None or batch):
+            raise ValueError("cache needs a seed and does not support batch")
+        self.cache = cache
+        self.n_jobs = n_jobs  # the number of worker processes, 1 runs serially
+        self.seed = seed
+        with self.profiler.phase("join"):
+            self.series_df = join_playoff_standings()
         self.winner_accuracy = 0
         self.games_accuracy = 0
 
@@ -190,60 +896,179 @@ class SimSeriesAll:
         if self.sim_round != "all":
             self.series_df = self.series_df.loc[self.series_df.Round.str.contains(self.sim_round)].reset_index(drop=True)
 
-    def _sim_series_historic(self):
-        for idx in self.series_df.index:
+    def _matchup(self, series):
+        """
+        Returns (team1, team2, num_games) for a historical series, where team1
+        is the team with home court advantage
+        """
+        seed_winner = series.seed_winner
+        seed_loser = series.seed_loser
+        yr = series.YR
 
-            series = self.series_df.iloc[idx]
-            seed_winner = series.seed_winner
-            seed_loser = series.seed_loser
-            yr = series.YR
+        if (seed_winner < seed_loser) and (series.Round != "Finals"):
+            team1 = series.Winner
+            team2 = series.Loser
 
-            if (seed_winner < seed_loser) and (series.Round != "Finals"):
-                team1 = series.Winner
-                team2 = series.Loser
+        elif (seed_winner> seed_loser) and (series.Round != "Finals"):
+            team1 = series.Loser
+            team2 = series.Winner
 
-            elif (seed_winner> seed_loser) and (series.Round != "Finals"):
-                team1 = series.Loser
-                team2 = series.Winner
+        elif (series.Round == "Finals") and (series.Pct_winner > series.Pct_loser):
+            team1 = series.Winner
+            team2 = series.Loser
+
+        elif (series.Round == "Finals") and (series.Pct_winner < series.Pct_loser):
+            team1 = series.Loser
+            team2 = series.Winner
 
-            elif (series.Round == "Finals") and (series.Pct_winner > series.Pct_loser):
+        elif (series.Round == "Finals") and (series.Pct_winner == series.Pct_loser):
+            # Special cases for 1990, 1998, 2001
+            if (yr == 1990) or (yr == 2001):
                 team1 = series.Winner
                 team2 = series.Loser
 
-            elif (series.Round == "Finals") and (series.Pct_winner < series.Pct_loser):
+            elif yr == 1998:
                 team1 = series.Loser
                 team2 = series.Winner
 
-            elif (series.Round == "Finals") and (series.Pct_winner == series.Pct_loser):
-                # Special cases for 1990, 1998, 2001
-                if (yr == 1990) or (yr == 2001):
-                    team1 = series.Winner
-                    team2 = series.Loser
+        if (yr < 2003) and ("First Round" in series.Round):
+            num_games = 5
 
-                elif yr == 1998:
-                    team1 = series.Loser
-                    team2 = series.Winner
+        else:
+            num_games = 7
 
-            if (yr < 2003) and ("First Round" in series.Round):
-                num_games = 5
+        return team1, team2, num_games
 
-            else:
-                num_games = 7
+    def _series_seed(self, year, team1, team2):
+        """
+        Returns the series' own child of seed, derived from the matchup rather
+        than its position so results don't depend on n_jobs, the round
+        selected or which seasons are in the data
+        """
+        return np.random.SeedSequence(self.seed, spawn_key=(int(year), zlib.crc32(team1.encode()),
+                                                            zlib.crc32(team2.encode())))
 
-            sim = SimSeries(team1=team1, team2=team2, year=yr,
-                            num_games=num_games)
-            sim.execute()
+    def _sim_series_historic(self):
+        matchups = []
+        for idx in self.series_df.index:
+            series = self.series_df.iloc[idx]
+            team1, team2, num_games = self._matchup(series)
+            matchups.append({"team1": team1, "team2": team2, "year": series.YR,
+                             "num_games": num_games, "method": self.method,
+                             "game_iters": self.game_iters,
+                             "series_iters": self.series_iters,
+                             "tolerance": self.tolerance,
+                             "sampler": self.sampler,
+                             "common_random_numbers": self.common_random_numbers,
+                             "game_method": self.game_method,
+                             "backend": self.backend,
+                             "seed": self._series_seed(series.YR, team1, team2),
+                             "profile": self.profiler is not NULL_PROFILER})
 
-            if sim.winner == series.Winner:
-                self.winner_accuracy += 1
-                self.series_df.loc[self.series_df.index == idx, "Correct_Winner"] = 1
+        if self.batch:
+            predicted = self._sim_batches(matchups)
+        elif self.cache is not None:
+            predicted = self._sim_matchups_cached(matchups)
+        else:
+            predicted = self._sim_matchups(matchups)
 
-            if sim.games == series.Games:
-                self.games_accuracy += 1
-                self.series_df.loc[self.series_df.index == idx, "Correct_Games"] = 1
+        predicted = pd.DataFrame(predicted, columns=["Predicted_Winner",
+                                                     "Predicted_Winner_Pct",
+                                                     "Predicted_Winner_Pct_Error",
+                                                     "Predicted_Games"],
+                                 index=self.series_df.index)
+        self.series_df = pd.concat([self.series_df, predicted], axis=1)
+        self.series_df.loc[:, "Correct_Winner"] = (self.series_df.Predicted_Winner ==
+                                                   self.series_df.Winner).astype(int)
+        self.series_df.loc[:, "Correct_Games"] = (self.series_df.Predicted_Games ==
+                                                  self.series_df.Games).astype(int)
+
+    def _map(self, func, items):
+        """
+        Yields func of every item, in order, serially or over n_jobs worker
+        processes
+        """
+        if self.n_jobs == 1:
+            yield from map(func, items)
+            return
 
-            self.series_df.loc[self.series_df.index == idx, "Predicted_Winner"] = sim.winner
-            self.series_df.loc[self.series_df.index == idx, "Predicted_Winner_Pct"] = sim.winner_pct
+        # Load the shared data before forking so every worker inherits it
+        team_index()
+        season_weights()
+        with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+            yield from executor.map(func, items,
+                                    chunksize=max(1, len(items) // (4 * self.n_jobs)))
+
+    def _sim_matchups(self, matchups):
+        """
+        Simulates every matchup as its own SimSeries. Returns a list of
+        (winner, winner_pct, winner_pct_error, games)
+        """
+        predicted = []
+        for idx, (*result, report) in enumerate(self._map(_sim_matchup, matchups)):
+            predicted.append(result)
+            if report is not None:
+                self.profiler.merge(report)
 
             if idx % 10 == 0:
                 print(f"Done {idx}")
+
+        return predicted
+
+    def _cache_key(self, matchup):
+        """
+        Every matchup argument that changes the result, with the run's seed in
+        place of the series' SeedSequence. The backend doesn't change results
+        """
+        fields = {name: value for name, value in matchup.items()
+                  if name not in ["seed", "profile", "backend"]}
+        return self.cache.key(**fields, seed=self.seed, data=data_fingerprint(),
+                              model_version=MODEL_VERSION)
+
+    def _sim_matchups_cached(self, matchups):
+        """
+        _sim_matchups for only the matchups missing from the cache, which are
+        then stored
+        """
+        keys = [self._cache_key(matchup) for matchup in matchups]
+        results = self.cache.get_many(keys)
+        missing = [idx for idx, key in enumerate(keys) if key not in results]
+        print(f"{len(results)} series cached, simulating {len(missing)}")
+
+        simulated = {keys[idx]: [str(winner), float(winner_pct), float(error), int(games)]
+                     for idx, (winner, winner_pct, error, games)
+                     in zip(missing, self._sim_matchups([matchups[idx] for idx in missing]))}
+        self.cache.put_many(simulated)
+        results.update(simulated)
+        return [results[key] for key in keys]
+
+    def _sim_batches(self, matchups):
+        """
+        Simulates each season's matchups as one SimSeriesBatch, seeded from a
+        child of seed per season. Returns a list of
+        (winner, winner_pct, winner_pct_error, games) in matchup order
+        """
+        years = sorted({matchup["year"] for matchup in matchups})
+        year_seeds = np.random.SeedSequence(self.seed).spawn(len(years))
+        batches = [{"matchups": [(m["year"], m["team1"], m["team2"], m["num_games"])
+                                 for m in matchups if m["year"] == year],
+                    "game_iters": self.game_iters, "series_iters": self.series_iters,
+                    "method": self.method, "game_method": self.game_method,
+                    "backend": self.backend,
+                    "seed": year_seed, "profile": self.profiler is not NULL_PROFILER}
+                   for year, year_seed in zip(years, year_seeds)]
+
+        results = {}
+        for year, (batch_results, report) in zip(years, self._map(_sim_batch, batches)):
+            results[year] = batch_results
+            if report is not None:
+                self.profiler.merge(report)
+            print(f"Done {year}")
+
+        # Matchups of a season come back in the order they were given
+        season_rows = {year: iter(batch_results.itertuples()) for year, batch_results in results.items()}
+        predicted = []
+        for matchup in matchups:
+            row = next(season_rows[matchup["year"]])
+            predicted.append((row.winner, row.winner_pct, row.winner_pct_error, row.games))
+        return predicted
@@ -1,18 +1,281 @@
+import hashlib
+import os
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
 
-def join_games_splits():
+
+# Process-wide cache of loaded datasets: name -> (file fingerprint, data)
+_data_cache = {}
+
+# Former names of franchises that relocated or were renamed, mapped to the
+# current name, so a franchise keeps one id across seasons. The 1989-2002
+# Charlotte Hornets belong to today's Charlotte franchise, as the NBA records
+# them, and the New Orleans Hornets to the Pelicans
+FRANCHISE_NAMES = {"Kansas City Kings": "Sacramento Kings",
+                   "San Diego Clippers": "Los Angeles Clippers",
+                   "Washington Bullets": "Washington Wizards",
+                   "New Jersey Nets": "Brooklyn Nets",
+                   "Seattle SuperSonics": "Oklahoma City Thunder",
+                   "Vancouver Grizzlies": "Memphis Grizzlies",
+                   "Charlotte Bobcats": "Charlotte Hornets",
+                   "New Orleans Hornets": "New Orleans Pelicans",
+                   "New Orleans/Oklahoma City Hornets": "New Orleans Pelicans"}
+
+# The six scoring rates of a team's split, in the order they are indexed
+RATE_COLUMNS = ["fg3", "fg2", "ft", "opp_fg3", "opp_fg2", "opp_ft"]
+VENUES = ["Home", "Visitor"]
+
+# Columns identifying a row of the Home Road Splits
+SPLIT_KEYS = ["team", "yr", "split_value"]
+
+# Columns of All_Games the season weights are fit on
+GAME_SCORE_COLUMNS = ["Visitor", "Visitor_Pts", "Home", "Home_Pts", "Playoffs", "YR"]
+
+# Season column of every table in data/, used to partition the columnar store
+SEASON_COLUMNS = {"All_Games": "YR", "Home_Visitor_Splits": "yr",
+                  "NBA_Playoffs": "YR", "NBA_Standings": "YR",
+                  "Offensive_Stats": "YR", "Defensive_Stats": "YR",
+                  "All_Season_Stats": "YR"}
+
+# Minimum rows in a row group of the columnar store. Small groups cost more
+# to read than a season filter saves on tables this size
+COLUMNAR_GROUP_ROWS = 10000
+
+
+def _file_fingerprint(paths):
     """
-    Function that merges the Home Road Splits with All_Games
+    Returns the (path, mtime, size) of every file so a cached dataset can tell
+    when one of its source files has been rewritten
     """
-    games = pd.read_csv("data/All_Games.csv", parse_dates=["Date"])
-    splits = pd.read_csv("data/Home_Visitor_Splits.csv")
+    fingerprint = []
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+
+def _cached(name, paths, loader):
+    """
+    Returns the dataset built by loader, loading it at most once per process
+    unless one of the files in paths changes on disk
+    """
+    fingerprint = _file_fingerprint(paths)
+    entry = _data_cache.get(name)
+    if entry is None or entry[0] != fingerprint:
+        entry = (fingerprint, loader())
+        _data_cache[name] = entry
+    return entry[1]
+
+
+def clear_data_cache():
+    """
+    Drops every cached dataset so the next call reloads from disk
+    """
+    _data_cache.clear()
+
+
+def convert_to_columnar():
+    """
+    Writes every table in data/ to data/columnar/<table>.parquet, sorted by
+    season in row groups of whole seasons, so readers can memory map only the
+    seasons and columns they need
+    """
+    os.makedirs("data/columnar", exist_ok=True)
+    for name, season_col in SEASON_COLUMNS.items():
+        parse_dates = ["Date"] if name == "All_Games" else None
+        table = pd.read_csv(f"data/{name}.csv", parse_dates=parse_dates)
+        table = table.sort_values(season_col, kind="stable").reset_index(drop=True)
+        arrow_table = pa.Table.from_pandas(table, preserve_index=False)
+
+        # Whole seasons are gathered into row groups of at least
+        # COLUMNAR_GROUP_ROWS rows
+        with pq.ParquetWriter(_columnar_path(name), arrow_table.schema) as writer:
+            start = 0
+            group_rows = 0
+            for size in table.groupby(season_col).size():
+                group_rows += size
+                if group_rows >= COLUMNAR_GROUP_ROWS:
+                    writer.write_table(arrow_table.slice(start, group_rows))
+                    start += group_rows
+                    group_rows = 0
+            if group_rows:
+                writer.write_table(arrow_table.slice(start, group_rows))
+
+        print(f"Converted {name}")
+
 
-    # Remove duplicate rows from splits (mistake in scraping thats too expensive to fix)
-    # Restrict games to 1984
-    splits = splits.drop_duplicates()
-    games = games.loc[games.YR >= 1984].reset_index(drop=True)
+def _columnar_path(name):
+    return f"data/columnar/{name}.parquet"
+
+
+def _use_columnar(name):
+    """
+    The columnar copy of a table is used when pyarrow is installed and the
+    copy was written after the CSV was last changed
+    """
+    path = _columnar_path(name)
+    return (pq is not None and os.path.exists(path) and
+            os.stat(path).st_mtime_ns >= os.stat(f"data/{name}.csv").st_mtime_ns)
+
+
+def _table_paths(name):
+    paths = [f"data/{name}.csv"]
+    if os.path.exists(_columnar_path(name)):
+        paths.append(_columnar_path(name))
+    return paths
+
+
+def _read_columnar(name, season_col, columns, years):
+    parquet_file = pq.ParquetFile(_columnar_path(name), memory_map=True)
+    if years is None:
+        return parquet_file.read(columns=columns).to_pandas()
+
+    # Only the row groups whose season range holds one of the years are read
+    years = sorted({int(year) for year in years})
+    season_idx = parquet_file.schema_arrow.get_field_index(season_col)
+    row_groups = []
+    for idx in range(parquet_file.num_row_groups):
+        stats = parquet_file.metadata.row_group(idx).column(season_idx).statistics
+        if any(stats.min <= year <= stats.max for year in years):
+            row_groups.append(idx)
+
+    read_columns = None
+    if columns is not None:
+        read_columns = list(columns) + ([season_col] if season_col not in columns else [])
+    table = parquet_file.read_row_groups(row_groups, columns=read_columns)
+    table = table.filter(pc.is_in(table[season_col], value_set=pa.array(years, table[season_col].type)))
+    if columns is not None:
+        table = table.select(list(columns))
+    return table.to_pandas()
+
+
+def read_table(name, columns=None, years=None):
+    """
+    Function that reads a table from data/, restricted to the given columns
+    and seasons. Reads the columnar store when it is present and up to date,
+    skipping the row groups of other seasons, and falls back to the CSV
+    otherwise
+    """
+    season_col = SEASON_COLUMNS[name]
+
+    if _use_columnar(name):
+        return _read_columnar(name, season_col, columns, years)
+
+    usecols = None
+    if columns is not None:
+        usecols = list(columns) + ([season_col] if season_col not in columns else [])
+    parse_dates = ["Date"] if name == "All_Games" and (columns is None or "Date" in columns) else None
+
+    table = pd.read_csv(f"data/{name}.csv", usecols=usecols, parse_dates=parse_dates)
+    if years is not None:
+        table = table.loc[table[season_col].isin(years)]
+
+    # Season order, as the columnar store holds the rows
+    table = table.sort_values(season_col, kind="stable").reset_index(drop=True)
+    if columns is not None:
+        table = table.loc[:, list(columns)]
+    return table
+
+
+def _load_splits(columns, years):
+    splits = read_table("Home_Visitor_Splits", columns=columns, years=years)
+
+    # Remove duplicate rows left by scrapes that appended instead of upserting
+    return splits.drop_duplicates().reset_index(drop=True)
+
+
+def load_splits(columns=None, years=None):
+    """
+    Function that returns the deduplicated Home Road Splits, restricted to
+    the given columns and seasons. Each selection is loaded once per process;
+    the frame is shared and must not be modified in place
+    """
+    columns = list(columns) if columns is not None else None
+    years = sorted(years) if years is not None else None
+    key = ("splits", columns and tuple(columns), years and tuple(years))
+    return _cached(key, _table_paths("Home_Visitor_Splits"),
+                   lambda: _load_splits(columns, years))
+
+
+class TeamIndex:
+    """
+    Integer index over the Home Road Splits. Every franchise gets one id
+    (see FRANCHISE_NAMES) and every season a position, and the six
+    RATE_COLUMNS of each (season, franchise, venue) are stored in the dense
+    array rates, so a lookup is array indexing instead of a string match.
+    Seasons a franchise didn't play are NaN
+    """
+    def __init__(self, splits):
+        self.first_season = int(splits.yr.min())
+        self.seasons = np.arange(self.first_season, int(splits.yr.max()) + 1)
+        franchises = splits.team.map(lambda team: FRANCHISE_NAMES.get(team, team))
+        self.franchises = sorted(franchises.unique())
+        self.franchise_ids = {name: idx for idx, name in enumerate(self.franchises)}
+        self.team_ids = {**{name: self.franchise_ids[FRANCHISE_NAMES.get(name, name)]
+                            for name in splits.team.unique()}, **self.franchise_ids}
+
+        season_pos = splits.yr.to_numpy() - self.first_season
+        team_pos = franchises.map(self.franchise_ids).to_numpy()
+        venue_pos = splits.split_value.map({venue: idx for idx, venue in enumerate(VENUES)}).to_numpy()
+        if pd.Series(list(zip(season_pos, team_pos, venue_pos))).duplicated().any():
+            raise ValueError("Two teams of the same franchise in one season")
+
+        self.rates = np.full((len(self.seasons), len(self.franchises), len(VENUES),
+                              len(RATE_COLUMNS)), np.nan)
+        self.rates[season_pos, team_pos, venue_pos] = splits[RATE_COLUMNS].to_numpy(dtype=float)
+
+    def team_id(self, team):
+        return self.team_ids[team]
+
+    def lookup(self, years, teams, venue):
+        """
+        Returns a (len(teams) x 6) array of RATE_COLUMNS for each year and
+        team at the venue
+        """
+        season_pos = np.asarray(years) - self.first_season
+        out_of_range = (season_pos < 0) | (season_pos >= len(self.seasons))
+        if out_of_range.any():
+            missing = [(year, team) for year, team, outside in zip(years, teams, out_of_range)
+                       if outside]
+            raise KeyError(f"No splits for {missing}")
+
+        team_pos = [self.team_ids[team] for team in teams]
+        rates = self.rates[season_pos, team_pos, VENUES.index(venue)]
+        if np.isnan(rates).any():
+            missing = [(year, team) for year, team, row in zip(years, teams, rates)
+                       if np.isnan(row).any()]
+            raise KeyError(f"No splits for {missing}")
+        return rates
+
+    def stats(self, year, team, venue):
+        """
+        Returns the team's RATE_COLUMNS in the season at the venue as a dict
+        """
+        return dict(zip(RATE_COLUMNS, self.lookup([year], [team], venue)[0].tolist()))
+
+
+def team_index():
+    """
+    Function that returns the TeamIndex of the Home Road Splits, built once
+    per process
+    """
+    return _cached("team_index", _table_paths("Home_Visitor_Splits"),
+                   lambda: TeamIndex(load_splits(columns=SPLIT_KEYS + RATE_COLUMNS)))
+
+
+def _join_games_splits(game_columns=None, split_columns=None):
+    splits = load_splits(columns=split_columns)
+
+    # Restrict games to 1984, the first season of the splits
+    games = read_table("All_Games", columns=game_columns,
+                       years=[yr for yr in splits.yr.unique() if yr >= 1984])
 
     home_stats = splits.loc[splits.split_value == "Home", [col for col in splits
                                                            if col != "split_value"]]\
@@ -33,12 +296,31 @@ def join_games_splits():
     return joint_df
 
 
-def join_playoff_standings():
+def join_games_splits():
     """
-    Function that merges NBA_Playoffs with NBA_Standings
+    Function that merges the Home Road Splits with All_Games.
+    The join runs once per process; the frame is shared and must not be
+    modified in place
     """
-    playoffs = pd.read_csv("data/NBA_Playoffs.csv")
-    standings = pd.read_csv("data/NBA_Standings.csv")
+    return _cached("games_splits", _table_paths("All_Games") +
+                   _table_paths("Home_Visitor_Splits"), _join_games_splits)
+
+
+def _join_game_scores():
+    """
+    The join of join_games_splits restricted to the scores in All_Games and
+    each team's points and points allowed, the columns the season weights
+    are fit on
+    """
+    return _cached("game_scores", _table_paths("All_Games") +
+                   _table_paths("Home_Visitor_Splits"),
+                   lambda: _join_games_splits(GAME_SCORE_COLUMNS,
+                                              SPLIT_KEYS + ["pts", "opp_pts"]))
+
+
+def _join_playoff_standings():
+    playoffs = read_table("NBA_Playoffs")
+    standings = read_table("NBA_Standings")
 
     merged_df = pd.merge(playoffs, standings, left_on=["Winner", "YR"],
                          right_on=["Team", "YR"], how="left")
@@ -50,6 +332,87 @@ def join_playoff_standings():
     return merged_df
 
 
+def join_playoff_standings():
+    """
+    Function that merges NBA_Playoffs with NBA_Standings.
+    Returns a copy of the cached join, so callers may write results into it
+    """
+    merged_df = _cached("playoff_standings", _table_paths("NBA_Playoffs") +
+                        _table_paths("NBA_Standings"), _join_playoff_standings)
+    return merged_df.copy()
+
+
+def _fit_season_weights():
+    games = _join_game_scores()
+    games = games.loc[games.Playoffs == 0]
+
+    # Every regular season game gives two observations: each team's score
+    # against its own points per game and its opponent's points allowed
+    score = np.concatenate([games.Visitor_Pts, games.Home_Pts]).astype(float)
+    pts = np.concatenate([games.pts_visitor, games.pts_home]).astype(float)
+    opp_pts = np.concatenate([games.opp_pts_home, games.opp_pts_visitor]).astype(float)
+    yr = np.concatenate([games.YR, games.YR])
+
+    # Per season no-intercept least squares of score on (pts, opp_pts), solved
+    # from the grouped sums of the 2x2 normal equations
+    sums = pd.DataFrame({"YR": yr, "xx": pts * pts, "xy": pts * opp_pts,
+                         "yy": opp_pts * opp_pts, "xs": pts * score,
+                         "ys": opp_pts * score}).groupby("YR").sum()
+    det = sums["xx"] * sums["yy"] - sums["xy"] ** 2
+
+    weights = pd.DataFrame({
+        "off_weight": (sums["yy"] * sums["xs"] - sums["xy"] * sums["ys"]) / det,
+        "def_weight": (sums["xx"] * sums["ys"] - sums["xy"] * sums["xs"]) / det,
+    })
+    return weights
+
+
+def _load_season_weights():
+    sources = ["data/All_Games.csv", "data/Home_Visitor_Splits.csv"]
+    newest_source = max(os.stat(path).st_mtime_ns for path in sources)
+
+    if (os.path.exists("data/Season_Weights.csv") and
+            os.stat("data/Season_Weights.csv").st_mtime_ns >= newest_source):
+        return pd.read_csv("data/Season_Weights.csv", index_col="YR")
+
+    # Written to a file of this process's own and swapped in atomically, so
+    # a simulation starting in another process never reads it half written
+    weights = _fit_season_weights()
+    tmp_path = f"data/Season_Weights.csv.{os.getpid()}.tmp"
+    weights.to_csv(tmp_path)
+    os.replace(tmp_path, "data/Season_Weights.csv")
+    return weights
+
+
+def season_weights():
+    """
+    Function that returns the off_weight and def_weight for every season,
+    indexed by YR. The fit is stored in data/Season_Weights.csv and redone
+    only when All_Games or the Home Road Splits change
+    """
+    return _cached("season_weights", ["data/All_Games.csv",
+                                      "data/Home_Visitor_Splits.csv"],
+                   _load_season_weights)
+
+
+def _hash_files(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def data_fingerprint():
+    """
+    Function that returns a hash of the contents of the files the simulations
+    read, the Home Road Splits and All_Games the season weights are fit on.
+    Unlike the mtime fingerprint it is stable across checkouts and copies
+    """
+    paths = ["data/Home_Visitor_Splits.csv", "data/All_Games.csv"]
+    return _cached("data_fingerprint", paths, lambda: _hash_files(paths))
+
+
 def join_datasets():
     """
     Function that merges offensive and defensive stats with All_Games
@@ -112,6 +475,9 @@ def calc_totals(joint_df):
 
 
 def split_train_test_sets(joint_df, test_size=0.2):
+    # Imported here so the simulators don't pay for loading sklearn
+    from sklearn.model_selection import train_test_split
+
     joint_df = joint_df.loc[joint_df["Playoffs"] == 0]
     X = joint_df.loc[:, ["3P_off_visitor", "2P_off_visitor", "FT_off_visitor",
                          "3P_off_home", "2P_off_home", "FT_off_home",
@@ -125,3 +491,5 @@ def split_train_test_sets(joint_df, test_size=0.2):
     return X_train, X_val, y_train, y_val
 
 
+if __name__ == "__main__":
+    convert_to_columnar()
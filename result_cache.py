@@ -0,0 +1,77 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+
+CACHE_PATH = "data/series_cache.sqlite"
+
+
+class ResultCache:
+    """
+    Disk backed cache of simulated series results, stored in sqlite so it
+    survives between runs and can be shared by worker processes. Entries are
+    keyed by a hash of everything that determines a result: the matchup,
+    iteration counts, seed, data fingerprint and model version. Once more
+    than max_entries are stored the least recently used are evicted
+    """
+    def __init__(self, path=CACHE_PATH, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS results ("
+                         "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                         "last_used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def key(**fields):
+        """
+        Returns the cache key of a result from the fields that determine it
+        """
+        return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get_many(self, keys):
+        """
+        Returns {key: value} for the keys that are cached, marking them used
+        """
+        found = {}
+        with self._connect() as conn:
+            # sqlite limits the number of bound parameters per statement
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = conn.execute(f"SELECT key, value FROM results WHERE key IN "
+                                    f"({','.join('?' * len(chunk))})", chunk).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+
+            now = time.time()
+            conn.executemany("UPDATE results SET last_used = ? WHERE key = ?",
+                             [(now, key) for key in found])
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """
+        Stores {key: value} and evicts the least recently used entries past
+        max_entries. Values must be json serialisable
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO results (key, value, last_used) VALUES (?, ?, ?)",
+                             [(key, json.dumps(value), now) for key, value in items.items()])
+
+            excess = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute("DELETE FROM results WHERE key IN "
+                             "(SELECT key FROM results ORDER BY last_used LIMIT ?)", (excess,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results")
@@ -1,38 +1,48 @@
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+import fetch
+import parse_html
+from manifest import Manifest
+from writer import OrderedWriter
 from queue import Queue
 from threading import Thread
 
 
 season_queue = Queue()
 num_threads = 10
+seasons = range(1980, 2021)
+manifest = Manifest()
 
 
 def months_in_season(yr):
     url = f"https://www.basketball-reference.com/leagues/NBA_{yr}_games-february.html"
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, "html.parser")
-    months_tag = soup.find("div", {"class": "filter"})
-    months_in_season = months_tag.text.strip().lower().split("\n\n")
+    response = fetch.get(url)
+    doc = parse_html.parse_page(response.content)
+    months_tag = doc.find_class("filter")[0]
+    months_in_season = months_tag.text_content().strip().lower().split("\n\n")
 
     return months_in_season
 
 
-def scrape_one_season_games(q, i):
+def scrape_one_season_games(q, i, writer):
     while True:
         yr = q.get()
 
+        if manifest.is_complete("games", yr):
+            print(f"Skipping {yr}")
+            writer.put(yr, None)
+            q.task_done()
+            continue
+
         print(f"Starting {yr} {i+1}")
         months = months_in_season(yr)
 
-        df_season = pd.DataFrame(columns=["Date", "Visitor", "Visitor_Pts", "Home", "Home_Pts", "OT"])
+        df_months = []
 
         for m in months:
             url = f"https://www.basketball-reference.com/leagues/NBA_{yr}_games-{m}.html"
-            response = requests.get(url)
-            soup = BeautifulSoup(response.content, "html.parser")
-            df_month = pd.read_html(str(soup.find_all("table")[0]))[0]
+            response = fetch.get(url)
+            doc = parse_html.parse_page(response.content)
+            df_month = parse_html.table_to_df(parse_html.find_table(doc))
 
             if "Start (ET)" in df_month.columns:
                 df_month = df_month.drop("Start (ET)", axis=1)
@@ -47,10 +57,10 @@ def scrape_one_season_games(q, i):
             df_month.loc[df_month["Del_OT"].isna(), "OT"] = 0
             df_month = df_month.drop(["Del1", "Del2", "Del3", "Del_OT"],
                                      axis=1)
-            df_season = df_season.append(df_month)
+            df_months.append(df_month)
 
         # Playoffs=1 for playoff games, 0 for regular season games
-        df_season = df_season.reset_index(drop=True)
+        df_season = pd.concat(df_months, ignore_index=True)
 
         # 2020 has no playoffs as of yet
         if yr != 2020:
@@ -78,31 +88,31 @@ def scrape_one_season_games(q, i):
 
         df_season.loc[:, "YR"] = yr
 
-        df_season.to_csv("All_Games.csv", mode="a", header=False, index=False)
-
+        writer.put(yr, df_season)
 
         print(f"Done {yr}")
         q.task_done()
 
 
 def scrape_all_games():
+    writer = OrderedWriter("All_Games.csv", ["YR"], seasons, manifest, "games")
+    writer.start()
+
     for i in range(num_threads):
-        worker = Thread(target=scrape_one_season_games, args=(season_queue, i))
+        worker = Thread(target=scrape_one_season_games, args=(season_queue, i, writer))
         worker.setDaemon(True)
         worker.start()
 
-    for yr in range(1980, 2021):
+    for yr in seasons:
         season_queue.put(yr)
 
     print("***Starting Process\n")
     season_queue.join()
+    writer.close()
     print("***Done")
 
 
 def main():
-    all_games = pd.DataFrame(columns=['Date', 'Visitor', 'Visitor_Pts', 'Home', 'Home_Pts', 'OT', "Playoffs", "YR"])
-    all_games.to_csv("All_Games.csv", index=False)
-
     scrape_all_games()
 
 
@@ -1,6 +1,8 @@
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+import fetch
+import parse_html
+from manifest import Manifest
+from writer import OrderedWriter
 from queue import Queue
 from threading import Thread
 import time
@@ -9,74 +11,89 @@ import time
 standings_queue = Queue()
 playoff_queue = Queue()
 num_threads = 10
+manifest = Manifest()
 
 
-def scrape_single_standings(q):
+def scrape_single_standings(q, writer):
     while True:
         yr = q.get()
 
+        if manifest.is_complete("standings", yr):
+            print(f"Skipping {yr}")
+            writer.put(yr, None)
+            q.task_done()
+            continue
+
         print(f"Starting {yr}")
 
         url = f"https://www.landofbasketball.com/yearbyyear/{yr-1}_{yr}_standings.htm"
 
-        response = requests.get(url)
+        response = fetch.get(url)
         html = response.text
-        soup = BeautifulSoup(html, "html.parser")
+        doc = parse_html.parse_page(html)
 
-        west = pd.read_html(str(soup.findAll("table")[0]))[0]
+        west = parse_html.table_to_df(parse_html.find_table(doc, index=0))
         west.columns = list(west.iloc[0])
         west = west.iloc[1:]
         west = west.loc[:, ["Team", "W", "L", "Pct", "GB"]]
         west.loc[:, "Conference"] = "West"
-        west.loc[:, "Seed"] = west.index
+        west.loc[:, "seed"] = west.index
         west.loc[:, "YR"] = yr
 
-        east = pd.read_html(str(soup.findAll("table")[1]))[0]
+        east = parse_html.table_to_df(parse_html.find_table(doc, index=1))
         east.columns = list(east.iloc[0])
         east = east.iloc[1:]
         east = east.loc[:, ["Team", "W", "L", "Pct", "GB"]]
         east.loc[:, "Conference"] = "East"
-        east.loc[:, "Seed"] = east.index
+        east.loc[:, "seed"] = east.index
         east.loc[:, "YR"] = yr
 
         combined_standings = pd.concat([west, east])
-        combined_standings.to_csv("NBA_Standings.csv", mode="a", index=False, header=False)
+        writer.put(yr, combined_standings)
 
         print(f"Done {yr}")
         q.task_done()
 
 
 def scrape_all_standings():
+    seasons = range(1984, 2021)
+    writer = OrderedWriter("NBA_Standings.csv", ["YR"], seasons, manifest, "standings")
+    writer.start()
+
     for i in range(num_threads):
-        worker = Thread(target=scrape_single_standings, args=(standings_queue,))
+        worker = Thread(target=scrape_single_standings, args=(standings_queue, writer))
         worker.setDaemon(True)
         worker.start()
 
-    for yr in range(1984, 2021):
+    for yr in seasons:
         standings_queue.put(yr)
 
     print("***Starting Standings Queue")
     standings_queue.join()
+    writer.close()
     print("***Done Standings Queue")
 
 
-def scrape_single_playoffs(q):
+def scrape_single_playoffs(q, writer):
     while True:
         yr = q.get()
 
-        print(f"Starting {yr}")
-
-        url = f"https://www.basketball-reference.com/leagues/NBA_{yr}.html"
+        if manifest.is_complete("playoffs", yr):
+            print(f"Skipping {yr}")
+            writer.put(yr, None)
+            q.task_done()
+            continue
 
-        response = requests.get(url)
-        html = response.text
-        soup = BeautifulSoup(html, "html.parser")
+        print(f"Starting {yr}")
 
-        playoffs_section = list(soup.find("div", {"id": "all_all_playoffs"}).children)[5]
-        playoff_soup = BeautifulSoup(playoffs_section, "html.parser")
+        html = fetch.get_season_page(yr)
+        doc = parse_html.parse_page(html)
 
-        playoff_df = pd.read_html(str(playoff_soup.findAll("table")[0]))[0]
-        playoff_df.columns = ["Round", "Result", "del", "del", "del", "del"]
+        # The playoff table is inside an html comment, only the first two
+        # columns (round and "Winner over Loser (W-L)") are needed
+        playoff_df = parse_html.table_to_df(parse_html.find_table(doc, "all_all_playoffs"))
+        playoff_df = playoff_df.iloc[:, :2]
+        playoff_df.columns = ["Round", "Result"]
         playoff_df = playoff_df.loc[playoff_df["Result"].str.contains("over") == True, ["Round", "Result"]]
 
         playoff_df.Result = playoff_df.Result.str.split(" over ")
@@ -87,33 +104,34 @@ def scrape_single_playoffs(q):
         playoff_df = playoff_df.drop("Result", axis=1)
         playoff_df.loc[:, "Loser"] = playoff_df.loc[:, "Loser"].str.replace(r"\(.*\)", "").str.strip()
 
-        playoff_df.to_csv("NBA_Playoffs.csv", mode="a", index=False, header=False)
+        writer.put(yr, playoff_df)
 
         print(f"Done {yr}")
         q.task_done()
 
 
 def scrape_all_playoffs():
+    seasons = range(1984, 2020)
+    writer = OrderedWriter("NBA_Playoffs.csv", ["YR"], seasons, manifest, "playoffs")
+    writer.start()
+
     for i in range(num_threads):
-        worker = Thread(target=scrape_single_playoffs, args=(playoff_queue,))
+        worker = Thread(target=scrape_single_playoffs, args=(playoff_queue, writer))
         worker.setDaemon(True)
         worker.start()
 
-    for yr in range(1984, 2020):
+    for yr in seasons:
         playoff_queue.put(yr)
 
     print("***Starting Playoff Queue")
     playoff_queue.join()
+    writer.close()
     print("***Done Playoff Queue")
 
 
 def main():
-    # standings = pd.DataFrame(columns=["Team", "W", "L", "Pct", "GB", "Conference", "YR", "seed"])
-    # standings.to_csv("NBA_Standings.csv", index=False)
     # scrape_all_standings()
 
-    playoff_df = pd.DataFrame(columns=["Round", "Winner", "Loser", "Games"])
-    playoff_df.to_csv("NBA_Playoffs.csv", index=False)
     scrape_all_playoffs()
 
 
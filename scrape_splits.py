@@ -1,102 +1,115 @@
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+import fetch
+import parse_html
+from manifest import Manifest
+from writer import OrderedWriter
 from queue import Queue
 from threading import Thread
-import time
 
 
 abbrev_queue = Queue()
 split_queue = Queue()
 num_threads = 4
+manifest = Manifest()
 
 
-def scrape_single_abbrev(q):
+def scrape_single_abbrev(q, writer):
     while True:
         yr = q.get()
-        print(f"Starting {yr}")
 
-        url = f"https://www.basketball-reference.com/leagues/NBA_{yr}.html"
+        if manifest.is_complete("abbrev", yr):
+            print(f"Skipping {yr}")
+            writer.put(yr, None)
+            q.task_done()
+            continue
+
+        print(f"Starting {yr}")
 
-        response = requests.get(url)
-        html = response.content
-        soup = BeautifulSoup(html, "html.parser")
+        doc = parse_html.parse_page(fetch.get_season_page(yr))
 
-        team_tags = soup.find_all("th", {"class": "left", "scope": "row",
-                                         "data-stat": "team_name"})
+        team_tags = doc.xpath('//th[@scope="row" and @data-stat="team_name" and '
+                              'contains(concat(" ", @class, " "), " left ")]')
 
-        abbrev_df = pd.DataFrame(columns=["Team", "YR", "Abbrev"])
+        abbrev_rows = []
         for tag in team_tags:
             append_dict = {}
-            a_tag = tag.findChildren("a")[0]
-            link_parts = a_tag.attrs["href"].split("/")
-            append_dict["Team"] = a_tag.text
+            a_tag = tag.xpath(".//a")[0]
+            link_parts = a_tag.get("href").split("/")
+            append_dict["Team"] = a_tag.text_content()
             append_dict["Abbrev"] = link_parts[2]
             append_dict["YR"] = yr
 
             assert str(yr) == link_parts[3][:4]
 
-            abbrev_df = abbrev_df.append(append_dict, ignore_index=True)
+            abbrev_rows.append(append_dict)
 
-        abbrev_df.to_csv("Team_Abbreviations.csv", mode="a", index=False, header=False)
+        abbrev_df = pd.DataFrame(abbrev_rows, columns=["Team", "YR", "Abbrev"])
 
-        print(f"Done {yr}")
+        writer.put(yr, abbrev_df)
 
-        time.sleep(1)
+        print(f"Done {yr}")
 
         q.task_done()
 
 
 def scrape_all_abbrev():
+    seasons = range(1984, 2021)
+    writer = OrderedWriter("Team_Abbreviations.csv", ["YR"], seasons, manifest, "abbrev")
+    writer.start()
+
     for i in range(num_threads):
-        worker = Thread(target=scrape_single_abbrev, args=(abbrev_queue,))
+        worker = Thread(target=scrape_single_abbrev, args=(abbrev_queue, writer))
         worker.setDaemon(True)
         worker.start()
 
-    for yr in range(1984, 2021):
+    for yr in seasons:
         abbrev_queue.put(yr)
 
     print("***Starting Abbreviation Queue")
     abbrev_queue.join()
+    writer.close()
     print("***Done Abbreviation Queue")
 
 
-def scrape_single_team_splits(q):
+def scrape_single_team_splits(q, writer):
     while True:
         team, yr, abbrev = q.get()
+
+        if manifest.is_complete("splits", yr, abbrev):
+            print(f"Skipping {abbrev}, {yr}")
+            writer.put((yr, abbrev), None)
+            q.task_done()
+            continue
+
         print(f"Starting {abbrev}, {yr}")
 
         url = f"https://www.basketball-reference.com/teams/{abbrev}/{yr}/splits/"
 
-        response = requests.get(url)
-        html = response.content
-        soup = BeautifulSoup(html, "html.parser")
-
-        split_df = pd.DataFrame(columns=["split_value", "g", "wins", "losses",
-                                         "fg", "fga", "fg3", "fg3a", "ft",
-                                         "fta", "orb", "trb", "ast", "stl",
-                                         "blk", "tov", "pf", "pts", "opp_fg",
-                                         "opp_fga", "opp_fg3", "opp_fg3a",
-                                         "opp_ft", "opp_fta", "opp_orb",
-                                         "opp_trb", "opp_ast", "opp_stl",
-                                         "opp_blk", "opp_tov", "opp_pf",
-                                         "opp_pts"])
-
-        # home_split_tag = soup.findAll("tr")[4].findChildren("td")
-        # road_split_tag = soup.findAll("tr")[5].findChildren("td")
-
-        for tags in soup.findAll("tr")[4:6]:
-            tag = tags.findChildren("td")
+        response = fetch.get(url)
+        doc = parse_html.parse_page(response.content)
+
+        split_columns = ["split_value", "g", "wins", "losses", "fg", "fga",
+                         "fg3", "fg3a", "ft", "fta", "orb", "trb", "ast", "stl",
+                         "blk", "tov", "pf", "pts", "opp_fg", "opp_fga",
+                         "opp_fg3", "opp_fg3a", "opp_ft", "opp_fta", "opp_orb",
+                         "opp_trb", "opp_ast", "opp_stl", "opp_blk", "opp_tov",
+                         "opp_pf", "opp_pts"]
+
+        # The home and road splits are the 5th and 6th rows on the page
+        split_rows = []
+        for tags in doc.xpath("//tr")[4:6]:
             append_dict = {}
-            for t in tag:
-                col = t.attrs["data-stat"]
-                val = t.text
+            for t in tags.xpath("./td"):
+                col = t.get("data-stat")
+                val = t.text_content()
                 append_dict[col] = val
 
             # Replace "Road" with "Visitor" for consistency
             if append_dict["split_value"] == "Road":
                 append_dict["split_value"] = "Visitor"
-            split_df = split_df.append(append_dict, ignore_index=True)
+            split_rows.append(append_dict)
+
+        split_df = pd.DataFrame(split_rows, columns=split_columns)
 
         split_df.loc[:, "fg2"] = split_df["fg"].astype(float) - split_df["fg3"].astype(float)
         split_df.loc[:, "opp_fg2"] = split_df["opp_fg"].astype(float) - split_df["opp_fg3"].astype(float)
@@ -105,21 +118,25 @@ def scrape_single_team_splits(q):
         split_df["yr"] = yr
         split_df["abbrev"] = abbrev
 
-
-        split_df.to_csv("Home_Visitor_Splits.csv", mode="a", index=False, header=False)
+        writer.put((yr, abbrev), split_df)
         print(f"Done {abbrev}, {yr}")
 
-
         q.task_done()
 
 
 def scrape_all_splits():
+    abbrev_df = pd.read_csv("Team_Abbreviations.csv")
+
+    # Splits are written in (season, team) order
+    keys = sorted(zip(abbrev_df["YR"], abbrev_df["Abbrev"]))
+    writer = OrderedWriter("Home_Visitor_Splits.csv", ["team", "yr"], keys, manifest, "splits")
+    writer.start()
+
     for i in range(num_threads):
-        worker = Thread(target=scrape_single_team_splits, args=(split_queue,))
+        worker = Thread(target=scrape_single_team_splits, args=(split_queue, writer))
         worker.setDaemon(True)
         worker.start()
 
-    abbrev_df = pd.read_csv("Team_Abbreviations.csv")
     for idx in range(abbrev_df.shape[0]):
         row = abbrev_df.iloc[idx]
 
@@ -130,27 +147,15 @@ def scrape_all_splits():
 
     print("***Starting Split Queue")
     split_queue.join()
+    writer.close()
     print("***Done Split Queue")
 
 
 def main():
-    # abbrev_df = pd.DataFrame(columns=["Team", "YR", "Abbrev"])
-    # abbrev_df.to_csv("Team_Abbreviations.csv", index=False)
     # scrape_all_abbrev()
 
-    split_df = pd.DataFrame(columns=["split_value", "g", "wins", "losses",
-                                         "fg", "fga", "fg3", "fg3a", "ft",
-                                         "fta", "orb", "trb", "ast", "stl",
-                                         "blk", "tov", "pf", "pts", "opp_fg",
-                                         "opp_fga", "opp_fg3", "opp_fg3a",
-                                         "opp_ft", "opp_fta", "opp_orb",
-                                         "opp_trb", "opp_ast", "opp_stl",
-                                         "opp_blk", "opp_tov", "opp_pf",
-                                         "opp_pts", "fg2", "opp_fg2", "team",
-                                         "yr", "abbrev"])
-    split_df.to_csv("Home_Visitor_Splits.csv", index=False)
     scrape_all_splits()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,6 +1,7 @@
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+import fetch
+import parse_html
+from manifest import Manifest
+from writer import OrderedWriter
 from queue import Queue
 from threading import Thread
 
@@ -8,41 +9,32 @@ from threading import Thread
 off_stat_queue = Queue()
 def_stat_queue = Queue()
 num_threads = 4
+seasons = range(1980, 2021)
+manifest = Manifest()
 
-def one_season_stats(q, tag):
+def one_season_stats(q, tag, writer):
     """
-    Scrapes stats for every team from each season and appends stats to the
-    output csv.
+    Scrapes stats for every team from each season and hands them to the
+    writer of the output csv.
     """
     while True:
         yr = q.get()
-        print(f"Starting {yr}")
-
-        if tag == "all_team-stats-per_poss":
-            table_loc = 20
-
-        elif tag == "all_opponent-stats-per_poss":
-            table_loc = 16
 
-        response = requests.get(f"https://www.basketball-reference.com/leagues/NBA_{yr}.html")
-        html = response.content
-        outer_soup = BeautifulSoup(html, "html.parser")
+        if manifest.is_complete(tag, yr):
+            print(f"Skipping {yr}")
+            writer.put(yr, None)
+            q.task_done()
+            continue
 
-        # For some reason, the data frame needed cannot be scraped from the
-        # first beautiful soup object, so another soup object is created
-        outer_tag = outer_soup.find_all('div', {'id': tag})[0]
-        inner_html = str(list(outer_tag.descendants)[table_loc])
-        inner_soup = BeautifulSoup(inner_html, "html.parser")
+        print(f"Starting {yr}")
 
-        stats_yr = pd.read_html(str(inner_soup.find_all("table")[0]))[0]
+        # The stats table is inside an html comment in the tag's div
+        doc = parse_html.parse_page(fetch.get_season_page(yr))
+        stats_yr = parse_html.table_to_df(parse_html.find_table(doc, tag))
         stats_yr.loc[:, 'YR'] = int(yr)
         stats_yr['Team'] = stats_yr['Team'].str.replace("*", "")
 
-        if tag == "all_team-stats-per_poss":
-            stats_yr.to_csv("Offensive_Stats.csv", mode="a", header=False, index=False)
-
-        elif tag == "all_opponent-stats-per_poss":
-            stats_yr.to_csv("Defensive_Stats.csv", mode="a", header=False, index=False)
+        writer.put(yr, stats_yr)
 
         print(f"Done {yr}")
 
@@ -53,52 +45,47 @@ def scrape_off_stats():
     """
     Creates worker queue to call function to scrape each season individually.
     """
+    tag = "all_team-stats-per_poss"
+    writer = OrderedWriter("Offensive_Stats.csv", ["YR"], seasons, manifest, tag)
+    writer.start()
+
     for i in range(num_threads):
-        tag = "all_team-stats-per_poss"
-        worker = Thread(target=one_season_stats, args=(off_stat_queue, tag))
+        worker = Thread(target=one_season_stats, args=(off_stat_queue, tag, writer))
         worker.setDaemon(True)
         worker.start()
 
-    for yr in range(1980, 2021):
+    for yr in seasons:
         off_stat_queue.put(yr)
 
     print("***Starting Offensive Stats\n")
     off_stat_queue.join()
+    writer.close()
     print("***Done Offensive Stats")
 
 
 def scrape_def_stats():
+    tag = "all_opponent-stats-per_poss"
+    writer = OrderedWriter("Defensive_Stats.csv", ["YR"], seasons, manifest, tag)
+    writer.start()
+
     for i in range(num_threads):
-        tag = "all_opponent-stats-per_poss"
-        worker = Thread(target=one_season_stats, args=(def_stat_queue, tag))
+        worker = Thread(target=one_season_stats, args=(def_stat_queue, tag, writer))
         worker.setDaemon(True)
         worker.start()
 
-    for yr in range(1980, 2021):
+    for yr in seasons:
         def_stat_queue.put(yr)
 
     print("***Starting Defensive Stats\n")
     def_stat_queue.join()
+    writer.close()
     print("***Done Defensive Stats")
 
 
 def main():
-    off_stats = pd.DataFrame(
-        columns=['Rk', 'Team', 'G', 'MP', 'FG', 'FGA', 'FG%', '3P', '3PA',
-                 '3P%', '2P', '2PA', '2P%', 'FT', 'FTA', 'FT%', 'ORB', 'DRB',
-                 'TRB', 'AST', 'STL', 'BLK', 'TOV', 'PF', 'PTS', 'YR'])
-    off_stats.to_csv("Offensive_Stats.csv", index=False)
-
-    def_stats = pd.DataFrame(
-        columns=['Rk', 'Team', 'G', 'MP', 'FG', 'FGA', 'FG%', '3P', '3PA',
-                 '3P%', '2P', '2PA', '2P%', 'FT', 'FTA', 'FT%', 'ORB', 'DRB',
-                 'TRB', 'AST', 'STL', 'BLK', 'TOV', 'PF', 'PTS', 'YR'])
-    def_stats.to_csv("Defensive_Stats.csv", index=False)
-
     scrape_off_stats()
     scrape_def_stats()
 
 
 if __name__=="__main__":
     main()
-
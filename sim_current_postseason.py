@@ -1,55 +1,119 @@
 from preprocessing_data import *
-from postseason_sim import SimSeries
+from postseason_sim import SimSeries, SimSeriesBatch, season_matchup_matrix, series_win_pcts, exact_series
+from instrumentation import NULL_PROFILER
+import numpy as np
+
+# First round slots in bracket order, so adjacent slots meet in every round
+BRACKET_SEEDS = [1, 8, 4, 5, 2, 7, 3, 6]
+ROUNDS = ["Conference Semifinals", "Conference Finals", "Finals", "Champion"]
+
+
+def _a_has_home_court(round_idx, seed_a, seed_b, pct_a, pct_b):
+    """
+    Returns whether team a has home court in the series played to reach
+    ROUNDS[round_idx]: the better seed within a conference, or the better
+    record in the Finals. Works elementwise on arrays
+    """
+    if round_idx < 3:
+        return seed_a < seed_b
+    return pct_a >= pct_b
+
 
 class SimPlayoffs:
-    def __init__(self, standings, year):
+    def __init__(self, standings, year, game_iters=15000, seed=None,
+                 game_method="monte_carlo", batch=False, profiler=None):
+        self.profiler = profiler or NULL_PROFILER  # an instrumentation.Profiler to record phases
         self.standings = standings
         self.year = year
+        self.game_iters = game_iters
+        self.game_method = game_method  # see SimSeries
+        self.batch = batch  # play each round's series as one SimSeriesBatch
+        # Independent streams for the bracket draws, the matchup matrix and
+        # the series simulated round by round in execute
+        bracket_seed, matrix_seed, self.series_seeds = np.random.SeedSequence(seed).spawn(3)
+        self.rng = np.random.default_rng(bracket_seed)
+        # Unseeded runs pass no seed, so their matrix isn't kept in the
+        # process-wide cache of season_matchup_matrix
+        self.matrix_seed = int(matrix_seed.generate_state(1, np.uint64)[0]) if seed is not None else None
+        self.matrix = None  # the season's matchup matrix, built on first use
+        self.series_pcts = {}  # (team1, team2) -> team1's series win probability
 
     def execute(self):
+        if self.batch:
+            self._execute_batch()
+            return
+
         self._find_seeds()
         self._first_round()
         self._second_round()
         self._championship_round()
         self._finals()
 
+    def _series_kwargs(self):
+        """
+        Returns the SimSeries arguments for the next series of execute, each
+        series getting the next child of the series seed
+        """
+        return {"seed": self.series_seeds.spawn(1)[0],
+                "game_method": self.game_method, "profiler": self.profiler}
+
     def _find_seeds(self):
         west_standings = self.standings.loc[self.standings.Conference == "West"]
         east_standings = self.standings.loc[self.standings.Conference == "East"]
 
         self.west_seeds = {seed: west_standings.loc[west_standings.seed == seed, "Team"].item() for seed in range(1, 9)}
         self.east_seeds = {seed: east_standings.loc[east_standings.seed == seed, "Team"].item() for seed in range(1, 9)}
+        self.team_seeds = {team: seed for seeds in [self.east_seeds, self.west_seeds]
+                           for seed, team in seeds.items()}
+        self.team_pcts = self.standings.set_index("Team").Pct
+
+    def _home_court(self, team_a, team_b, round_idx):
+        """
+        Returns (team1, team2) for a series of execute, team1 having home court
+        """
+        if _a_has_home_court(round_idx, self.team_seeds[team_a], self.team_seeds[team_b],
+                             self.team_pcts[team_a], self.team_pcts[team_b]):
+            return team_a, team_b
+        return team_b, team_a
 
     def _first_round(self):
-        east1_8 = SimSeries(self.east_seeds[1], self.east_seeds[8], self.year)
+        east1_8 = SimSeries(self.east_seeds[1], self.east_seeds[8], self.year,
+                            **self._series_kwargs())
         east1_8.execute()
         self.east1_8_winner = east1_8.winner
 
-        east2_7 = SimSeries(self.east_seeds[2], self.east_seeds[7], self.year)
+        east2_7 = SimSeries(self.east_seeds[2], self.east_seeds[7], self.year,
+                            **self._series_kwargs())
         east2_7.execute()
         self.east2_7_winner = east2_7.winner
 
-        east3_6 = SimSeries(self.east_seeds[3], self.east_seeds[6], self.year)
+        east3_6 = SimSeries(self.east_seeds[3], self.east_seeds[6], self.year,
+                            **self._series_kwargs())
         east3_6.execute()
         self.east3_6_winner = east3_6.winner
 
-        east4_5 = SimSeries(self.east_seeds[4], self.east_seeds[5], self.year)
+        east4_5 = SimSeries(self.east_seeds[4], self.east_seeds[5], self.year,
+                            **self._series_kwargs())
         east4_5.execute()
         self.east4_5_winner = east4_5.winner
 
-        west1_8 = SimSeries(self.west_seeds[1], self.west_seeds[8], self.year)
+        west1_8 = SimSeries(self.west_seeds[1], self.west_seeds[8], self.year,
+                            **self._series_kwargs())
         west1_8.execute()
         self.west1_8_winner = west1_8.winner
 
-        west2_7 = SimSeries(self.west_seeds[2], self.west_seeds[7], self.year)
+        west2_7 = SimSeries(self.west_seeds[2], self.west_seeds[7], self.year,
+                            **self._series_kwargs())
         west2_7.execute()
         self.west2_7_winner = west2_7.winner
 
-        west3_6 = SimSeries(self.west_seeds[3], self.west_seeds[6], self.year)
+        west3_6 = SimSeries(self.west_seeds[3], self.west_seeds[6], self.year,
+                            **self._series_kwargs())
         west3_6.execute()
         self.west3_6_winner = west3_6.winner
 
-        west4_5 = SimSeries(self.west_seeds[4], self.west_seeds[5], self.year)
+        west4_5 = SimSeries(self.west_seeds[4], self.west_seeds[5], self.year,
+                            **self._series_kwargs())
         west4_5.execute()
         self.west4_5_winner = west4_5.winner
 
@@ -58,37 +122,145 @@ class SimPlayoffs:
               self.west3_6_winner, self.west4_5_winner)
 
     def _second_round(self):
-        east1_8_4_5 = SimSeries(self.east1_8_winner, self.east4_5_winner, self.year)
+        east1_8_4_5 = SimSeries(*self._home_court(self.east1_8_winner, self.east4_5_winner, 1),
+                                self.year, **self._series_kwargs())
         east1_8_4_5.execute()
         self.east_finalist1 = east1_8_4_5.winner
 
-        east2_7_3_6 = SimSeries(self.east2_7_winner, self.east3_6_winner, self.year)
+        east2_7_3_6 = SimSeries(*self._home_court(self.east2_7_winner, self.east3_6_winner, 1),
+                                self.year, **self._series_kwargs())
         east2_7_3_6.execute()
         self.east_finalist2 = east2_7_3_6.winner
 
-        west1_8_4_5 = SimSeries(self.west1_8_winner, self.west4_5_winner, self.year)
+        west1_8_4_5 = SimSeries(*self._home_court(self.west1_8_winner, self.west4_5_winner, 1),
+                                self.year, **self._series_kwargs())
         west1_8_4_5.execute()
         self.west_finalist1 = west1_8_4_5.winner
 
-        west2_7_3_6 = SimSeries(self.west2_7_winner, self.west3_6_winner, self.year)
+        west2_7_3_6 = SimSeries(*self._home_court(self.west2_7_winner, self.west3_6_winner, 1),
+                                self.year, **self._series_kwargs())
         west2_7_3_6.execute()
         self.west_finalist2 = west2_7_3_6.winner
 
         print(self.east_finalist1, self.east_finalist2, self.west_finalist1, self.west_finalist2)
 
     def _championship_round(self):
-        east = SimSeries(self.east_finalist1, self.east_finalist2, self.year)
+        east = SimSeries(*self._home_court(self.east_finalist1, self.east_finalist2, 2),
+                         self.year, **self._series_kwargs())
         east.execute()
         self.east_champ = east.winner
 
-        west = SimSeries(self.west_finalist1, self.west_finalist2, self.year)
+        west = SimSeries(*self._home_court(self.west_finalist1, self.west_finalist2, 2),
+                         self.year, **self._series_kwargs())
         west.execute()
         self.west_champ = west.winner
 
         print(self.east_champ, self.west_champ)
 
     def _finals(self):
-        finals = SimSeries(self.east_champ, self.west_champ, self.year)
+        finals = SimSeries(*self._home_court(self.east_champ, self.west_champ, 3),
+                           self.year, **self._series_kwargs())
         finals.execute()
         self.nba_champion = finals.winner
-        print(self.nba_champion)
\ No newline at end of file
+        print(self.nba_champion)
+
+    def _execute_batch(self):
+        """
+        Plays the bracket round by round, simulating all of a round's series
+        in one SimSeriesBatch. Sets round_winners, the teams reaching each of
+        ROUNDS, and nba_champion
+        """
+        self._find_seeds()
+        teams = ([self.east_seeds[seed] for seed in BRACKET_SEEDS] +
+                 [self.west_seeds[seed] for seed in BRACKET_SEEDS])
+
+        self.round_winners = {}
+        for round_idx, round_name in enumerate(ROUNDS):
+            matchups = [(self.year, *self._home_court(team_a, team_b, round_idx), 7)
+                        for team_a, team_b in zip(teams[0::2], teams[1::2])]
+
+            sim = SimSeriesBatch(matchups, game_iters=self.game_iters,
+                                 game_method=self.game_method,
+                                 seed=self.series_seeds.spawn(1)[0], profiler=self.profiler)
+            sim.execute()
+            teams = sim.results.winner.tolist()
+            self.round_winners[round_name] = teams
+            print(*teams)
+
+        self.nba_champion = teams[0]
+
+    def sim_brackets(self, n_brackets=100000):
+        """
+        Samples n_brackets whole tournaments, drawing every series winner from
+        the matchup's exact series win probability. Sets round_probs, each
+        team's probability of reaching each round and of winning the title.
+        A matchup's probability is simulated once and reused by every bracket
+        """
+        self._find_seeds()
+
+        # Teams 0-7 are the East in bracket order, 8-15 the West
+        self.bracket_teams = ([self.east_seeds[seed] for seed in BRACKET_SEEDS] +
+                              [self.west_seeds[seed] for seed in BRACKET_SEEDS])
+        seeds = np.array(BRACKET_SEEDS * 2)
+        team_standings = self.standings.set_index("Team")
+        pcts = team_standings.loc[self.bracket_teams, "Pct"].to_numpy(dtype=float)
+
+        alive = np.tile(np.arange(16), (n_brackets, 1))
+        reached = np.zeros((16, len(ROUNDS)))
+
+        with self.profiler.phase("bracket_sim"):
+            self._sim_rounds(alive, reached, seeds, pcts, n_brackets)
+        self.profiler.count("brackets", n_brackets)
+        self.profiler.count("rng_draws", n_brackets * (len(BRACKET_SEEDS) * 2 - 1))
+
+        self.round_probs = pd.DataFrame(reached, columns=ROUNDS,
+                                        index=pd.Index(self.bracket_teams, name="Team"))
+        self.round_probs = self.round_probs.sort_values("Champion", ascending=False)
+
+    def _sim_rounds(self, alive, reached, seeds, pcts, n_brackets):
+        """
+        Plays every round of the sampled brackets, filling in reached
+        """
+        for round_idx in range(len(ROUNDS)):
+            team_a = alive[:, 0::2]
+            team_b = alive[:, 1::2]
+
+            a_home = _a_has_home_court(round_idx, seeds[team_a], seeds[team_b],
+                                       pcts[team_a], pcts[team_b])
+
+            home = np.where(a_home, team_a, team_b)
+            visitor = np.where(a_home, team_b, team_a)
+
+            home_series_pct = self._series_pct_matrix(home, visitor)[home, visitor]
+            home_won = self.rng.random(home.shape) < home_series_pct
+            alive = np.where(home_won, home, visitor)
+
+            reached[:, round_idx] = np.bincount(alive.ravel(), minlength=16) / n_brackets
+
+    def _series_pct_matrix(self, home, visitor):
+        """
+        Returns a 16 x 16 matrix of the home team's series win probability,
+        filled in for every (home, visitor) pair in the arrays
+        """
+        matrix = np.zeros((16, 16))
+        for pair in np.unique(home * 16 + visitor):
+            home_idx, visitor_idx = divmod(int(pair), 16)
+            matrix[home_idx, visitor_idx] = self._series_pct(
+                self.bracket_teams[home_idx], self.bracket_teams[visitor_idx])
+        return matrix
+
+    def _series_pct(self, team1, team2):
+        """
+        Returns team1's probability of winning a best-of-7 series against team2
+        with home court, indexed from the season's matchup matrix
+        """
+        if (team1, team2) not in self.series_pcts:
+            if self.matrix is None:
+                with self.profiler.phase("matchup_matrix"):
+                    self.matrix = season_matchup_matrix(self.year, self.game_iters,
+                                                        self.matrix_seed, self.game_method)
+            team1_win_pct = series_win_pcts(self.matrix.loc[team1, team2],
+                                            1 - self.matrix.loc[team2, team1], 7)
+            self.series_pcts[(team1, team2)] = exact_series(team1_win_pct)[0].sum()
+
+        return self.series_pcts[(team1, team2)]
@@ -1,29 +1,44 @@
-from preprocessing_data import join_games_splits, join_playoff_standings
-import statsmodels.api as sm
+from preprocessing_data import join_playoff_standings, team_index, season_weights
+from postseason_sim import sim_game, series_win_pcts, sim_series
+from instrumentation import NULL_PROFILER
+import jit_kernels
 import numpy as np
-import pandas as pd
 import pyspark
 
+# Series iterations are drawn in fixed blocks, each with its own seed, so the
+# totals don't depend on how the blocks are split into chunks
+SERIES_BLOCK_ITERS = 1000
+
 
 class SimSeriesAll:
-    def __init__(self, series_iters=15000, game_iters=15000, sim_round="all"):
+    def __init__(self, series_iters=15000, game_iters=15000, sim_round="all",
+                 num_chunks=16, seed=None, backend="numpy", profiler=None):
+        self.profiler = profiler or NULL_PROFILER  # an instrumentation.Profiler to record phases
         self.series_iters = series_iters
         self.game_iters = game_iters
+        self.num_chunks = num_chunks  # the number of executor tasks per series
+        self.seed = seed
+        jit_kernels.check_backend(backend)
+        self.backend = backend  # see postseason_sim.SimSeries, needs numba on the executors
         self.sim_round = sim_round
-        self.series_df = join_playoff_standings()
-        self.game_stats = join_games_splits()
-        self.splits_data = pd.read_csv("data/Home_Visitor_Splits.csv")
-        self.splits_data = self.splits_data.drop_duplicates()
+        with self.profiler.phase("join"):
+            self.series_df = join_playoff_standings()
+        with self.profiler.phase("load"):
+            self.team_index = team_index()
         self.winner_accuracy = 0
 
     def execute(self):
         self._select_round()
-        self._compute_season_weights()
-        self._create_rdd()
-        # self._sim_all_series()
+        with self.profiler.phase("weights"):
+            self._compute_season_weights()
+        with self.profiler.phase("work_specs"):
+            self._create_work_specs()
+        with self.profiler.phase("spark"):
+            self._sim_all_series()
+        self._count_work()
 
-        # self.winner_accuracy = sum(self.series_df.Correct_Winner) / self.series_df.shape[0]
-        # self.games_accuracy = sum(self.series_df.Correct_Games) / self.series_df.shape[0]
+        self.winner_accuracy = sum(self.series_df.Correct_Winner) / self.series_df.shape[0]
+        self.games_accuracy = sum(self.series_df.Correct_Games) / self.series_df.shape[0]
 
     def _select_round(self):
         if self.sim_round != "all":
@@ -31,148 +46,173 @@ class SimSeriesAll:
 
     def _compute_season_weights(self):
         """
-        Calculates the off and def weights for a given season
+        Looks up the off and def weights for every season being simulated
         Returns a dictionary: key - year, value - (off_weight, def_weight)
         """
-        self.weights_dict = {}
-        for yr in self.series_df.YR.unique():
-            visitor_score_vs_ppg = self.game_stats.loc[
-                (self.game_stats.Playoffs == 0) & (self.game_stats.YR == yr),
-                ["Visitor_Pts", "pts_visitor", "opp_pts_home"]]
-            home_score_vs_ppg = self.game_stats.loc[
-                (self.game_stats.Playoffs == 0) & (self.game_stats.YR == yr),
-                ["Home_Pts", "pts_home", "opp_pts_visitor"]]
+        weights = season_weights()
+        self.weights_dict = {yr: (weights.loc[yr, "off_weight"],
+                                  weights.loc[yr, "def_weight"])
+                             for yr in self.series_df.YR.unique()}
 
-            visitor_score_vs_ppg.columns = ["Score", "PTS", "Opp_PTS"]
-            home_score_vs_ppg.columns = ["Score", "PTS", "Opp_PTS"]
+    def _create_work_specs(self):
+        """
+        Builds one compact game spec per series, carrying only the two teams'
+        scoring rates, the season weights and the seed of the game stage, and
+        the seeds of each series' blocks. Driver memory doesn't grow with
+        game_iters or series_iters; the iterations are expanded on the executors.
+
+        Every series gets its own child of seed. Its first child seeds the game
+        stage and the rest seed the series blocks, so results are the same for
+        any num_chunks or number of executors
+        """
+        series_seeds = np.random.SeedSequence(self.seed).spawn(self.series_df.shape[0])
+        num_blocks = -(-self.series_iters // SERIES_BLOCK_ITERS)
+        block_iters = [min(SERIES_BLOCK_ITERS, self.series_iters - block_start)
+                       for block_start in range(0, self.series_iters, SERIES_BLOCK_ITERS)]
 
-            combined_score_vs_ppg = pd.concat(
-                [visitor_score_vs_ppg, home_score_vs_ppg])
+        self.game_specs = []
+        self.series_blocks = {}
+        for idx in self.series_df.index:
+            series = self.series_df.iloc[idx]
+            team1, team2, num_games = self._matchup(series)
+            yr = series.YR
 
-            X = combined_score_vs_ppg.loc[:, ["PTS", "Opp_PTS"]].to_numpy()
-            Y = combined_score_vs_ppg.loc[:, "Score"].to_numpy()
-            Y = Y.reshape(-1, 1)
+            rates = (self.team_index.stats(yr, team1, "Home"),
+                     self.team_index.stats(yr, team2, "Visitor"),
+                     self.team_index.stats(yr, team2, "Home"),
+                     self.team_index.stats(yr, team1, "Visitor"))
+            off_weight = self.weights_dict[yr][0]
+            def_weight = self.weights_dict[yr][1]
 
-            model = sm.OLS(Y, X)
-            results = model.fit()
+            game_seed, *block_seeds = series_seeds[idx].spawn(1 + num_blocks)
+            self.game_specs.append((idx, num_games, rates, off_weight, def_weight,
+                                    self.game_iters, game_seed, self.backend))
+            self.series_blocks[idx] = list(zip(block_seeds, block_iters))
+        print("Created work specs")
 
-            off_weight = results.params[0]
-            def_weight = results.params[1]
+    def _create_chunk_specs(self, win_pcts):
+        """
+        Splits every series' blocks into num_chunks work specs, each carrying
+        the series' game win probabilities from win_pcts
+        """
+        self.work_specs = []
+        for idx, blocks in self.series_blocks.items():
+            chunk_size = -(-len(blocks) // self.num_chunks)
+            for chunk_start in range(0, len(blocks), chunk_size):
+                self.work_specs.append((idx, win_pcts[idx],
+                                        blocks[chunk_start:chunk_start + chunk_size],
+                                        self.backend))
+
+    def _count_work(self):
+        """
+        Counts the iterations run on the executors: both venues' games once
+        per series, then the series blocks of every chunk
+        """
+        for _, _, _, _, _, game_iters, _, _ in self.game_specs:
+            self.profiler.count("games", 2 * game_iters)
+            self.profiler.count("rng_draws", 24 * game_iters)
 
-            self.weights_dict[yr] = (off_weight, def_weight)
+        for _, team1_win_pct, blocks, _ in self.work_specs:
+            chunk_iters = sum(iters for _, iters in blocks)
+            self.profiler.count("series", chunk_iters)
+            self.profiler.count("rng_draws", chunk_iters * len(team1_win_pct))
 
-    def _create_rdd(self):
-        self.rdd_as_list = []
-        for idx in self.series_df.index:
+    def _matchup(self, series):
+        """
+        Returns (team1, team2, num_games) for a historical series, where team1
+        is the team with home court advantage
+        """
+        seed_winner = series.seed_winner
+        seed_loser = series.seed_loser
+        yr = series.YR
 
-            series = self.series_df.iloc[idx]
-            seed_winner = series.seed_winner
-            seed_loser = series.seed_loser
-            yr = series.YR
+        if (seed_winner < seed_loser) and (series.Round != "Finals"):
+            team1 = series.Winner
+            team2 = series.Loser
 
-            if (seed_winner < seed_loser) and (series.Round != "Finals"):
-                team1 = series.Winner
-                team2 = series.Loser
+        elif (seed_winner > seed_loser) and (series.Round != "Finals"):
+            team1 = series.Loser
+            team2 = series.Winner
 
-            elif (seed_winner > seed_loser) and (series.Round != "Finals"):
-                team1 = series.Loser
-                team2 = series.Winner
+        elif (series.Round == "Finals") and (series.Pct_winner > series.Pct_loser):
+            team1 = series.Winner
+            team2 = series.Loser
+
+        elif (series.Round == "Finals") and (series.Pct_winner < series.Pct_loser):
+            team1 = series.Loser
+            team2 = series.Winner
 
-            elif (series.Round == "Finals") and (series.Pct_winner > series.Pct_loser):
+        elif (series.Round == "Finals") and (series.Pct_winner == series.Pct_loser):
+            # Special cases for 1990, 1998, 2001
+            if (yr == 1990) or (yr == 2001):
                 team1 = series.Winner
                 team2 = series.Loser
-
-            elif (series.Round == "Finals") and (series.Pct_winner < series.Pct_loser):
+            elif yr == 1998:
                 team1 = series.Loser
                 team2 = series.Winner
 
-            elif (series.Round == "Finals") and (series.Pct_winner == series.Pct_loser):
-                # Special cases for 1990, 1998, 2001
-                if (yr == 1990) or (yr == 2001):
-                    team1 = series.Winner
-                    team2 = series.Loser
-                elif yr == 1998:
-                    team1 = series.Loser
-                    team2 = series.Winner
-
-            if (yr < 2003) and ("First Round" in series.Round):
-                num_games = 5
-            else:
-                num_games = 7
-
-            split_stats = self._retrieve_data(yr, team1, team2)
-            off_weight = self.weights_dict[yr][0]
-            def_weight = self.weights_dict[yr][1]
+        if (yr < 2003) and ("First Round" in series.Round):
+            num_games = 5
+        else:
+            num_games = 7
 
-            for series_id in range(self.series_iters):
-                for game_id in range(self.game_iters):
-                    for game in range(1, num_games + 1):
-                        if game in [1, 2, 5, 7]:
-                            self.rdd_as_list.append([yr, team1, team2, series_id,
-                                                     game_id, game, split_stats,
-                                                     off_weight, def_weight])
-                        elif game in [3, 4, 6]:
-                            self.rdd_as_list.append([yr, team2, team1, series_id,
-                                                     game_id, game, split_stats,
-                                                     off_weight, def_weight])
-            print(f"Completed {team1} vs {team2}")
-        print("Created RDD")
-
-    def _retrieve_data(self, year, team1, team2):
-        two_team_splits = (self.splits_data.loc[(self.splits_data.yr == year) &
-                                      ((self.splits_data.team == team1) |
-                                       (self.splits_data.team == team2))])
-        return two_team_splits
+        return team1, team2, num_games
 
     def _sim_all_series(self):
         sc = pyspark.SparkContext('local[*]')
-        results_rdd = sc.parallelize(self.rdd_as_list)
 
-        results_rdd = results_rdd.map(lambda x: self._single_game_sim(x[0], x[1], x[2],
-                                                                   x[3], x[4], x[5],
-                                                                   x[6], x[7], x[8]))
-        results_rdd.saveAsTextFile("output")
+        # The game stage runs once per series, and its win probabilities are
+        # shipped to every chunk of the series
+        games_rdd = sc.parallelize(self.game_specs, len(self.game_specs))
+        self._create_chunk_specs(dict(games_rdd.map(_sim_games).collect()))
+        specs_rdd = sc.parallelize(self.work_specs, len(self.work_specs))
+
+        # Each chunk returns a small (winner x games) count table, summed per series
+        result_tables = dict(specs_rdd.map(_sim_chunk)
+                                      .reduceByKey(lambda a, b: a + b)
+                                      .collect())
         sc.stop()
 
-    def _single_game_sim(self, yr, home, visitor, series_id, game_id, game, split_stats, off_weight, def_weight):
-        home_stats = split_stats.loc[(split_stats.split_value == "Home") & (split_stats.team == home)]
-        visitor_stats = split_stats.loc[(split_stats.split_value == "Visitor") & (split_stats.team == visitor)]
-        home_score = self._sim_score(home_stats, visitor_stats, off_weight, def_weight)
-        visitor_score = self._sim_score(visitor_stats, home_stats, off_weight, def_weight)
-
-        if home_score > visitor_score:
-            return [yr, home, visitor, series_id, game_id, game, split_stats,
-                    off_weight, def_weight, home_score, visitor_score,
-                    home, visitor]
-
-        elif visitor_score > home_score:
-            return [yr, home, visitor, series_id, game_id, game, split_stats,
-                    off_weight, def_weight, home_score, visitor_score,
-                    visitor, home]
-
-        elif home_score == visitor_score:
-            # If tied, pick random winner
-            coin_flip = np.random.binomial(1, 0.5)
-            if coin_flip == 0:
-                return [yr, home, visitor, series_id, game_id, game,
-                        split_stats, off_weight, def_weight, home_score,
-                        visitor_score, home, visitor]
-
-            elif coin_flip == 1:
-                return [yr, home, visitor, series_id, game_id, game,
-                        split_stats,
-                        off_weight, def_weight, home_score, visitor_score,
-                        visitor, home]
-
-    def _sim_score(self, off_stats, def_stats, off_weight, def_weight):
-        off_score = (3 * np.random.poisson(off_stats.fg3)) + \
-                    (2 * np.random.poisson(off_stats.fg2)) + \
-                    np.random.poisson(off_stats.ft)
-        def_score = (3 * np.random.poisson(def_stats.opp_fg3)) + \
-                    (2 * np.random.poisson(def_stats.opp_fg2)) + \
-                     np.random.poisson(def_stats.opp_ft)
-        weighted_score = (off_weight * off_score) + (def_weight * def_score)
-        return weighted_score.item()
+        for idx, result_table in result_tables.items():
+            team_wins = result_table.sum(axis=1)
+            winner_idx = int(np.argmax(team_wins))
+            team1, team2, _ = self._matchup(self.series_df.iloc[idx])
+
+            self.series_df.loc[idx, "Predicted_Winner"] = [team1, team2][winner_idx]
+            self.series_df.loc[idx, "Predicted_Winner_Pct"] = team_wins[winner_idx] / team_wins.sum()
+            self.series_df.loc[idx, "Predicted_Games"] = np.argmax(result_table) % result_table.shape[1]
+
+        self.series_df.loc[:, "Correct_Winner"] = (self.series_df.Predicted_Winner ==
+                                                   self.series_df.Winner).astype(int)
+        self.series_df.loc[:, "Correct_Games"] = (self.series_df.Predicted_Games ==
+                                                  self.series_df.Games).astype(int)
+
+
+def _sim_games(spec):
+    """
+    Runs on an executor: simulates both venues' games for a game spec.
+    Returns (series index, team1's win probability in each game)
+    """
+    idx, num_games, rates, off_weight, def_weight, game_iters, game_seed, backend = spec
+    team1_home, team2_visitor, team2_home, team1_visitor = rates
+    rng = np.random.default_rng(game_seed)
+
+    team1_home_win_pct = sim_game(team1_home, team2_visitor, off_weight,
+                                  def_weight, game_iters, rng, backend=backend)
+    team1_visitor_win_pct = 1 - sim_game(team2_home, team1_visitor, off_weight,
+                                         def_weight, game_iters, rng, backend=backend)
+    return idx, series_win_pcts(team1_home_win_pct, team1_visitor_win_pct, num_games)
+
+
+def _sim_chunk(spec):
+    """
+    Runs on an executor: simulates the chunk's series blocks for a work spec.
+    Returns (series index, count table)
+    """
+    idx, team1_win_pct, blocks, backend = spec
+    return idx, sum(sim_series(team1_win_pct, block_iters, np.random.default_rng(block_seed),
+                               backend=backend)
+                    for block_seed, block_iters in blocks)
 
 
 if __name__=="__main__":
@@ -0,0 +1,75 @@
+from queue import Queue
+from threading import Thread
+
+import pandas as pd
+
+from manifest import upsert_csv
+
+
+class OrderedWriter(Thread):
+    """
+    Single writer stage for a scraper's output csv. Worker threads only parse
+    and put (key, df) units on the writer's queue; keys are a season or a
+    (season, unit) tuple. The writer holds units that arrive early and, as
+    soon as the next units in keys order have all arrived, upserts them in
+    one atomic write, so the file is always written in the same order no
+    matter how the workers are scheduled. A unit put as None was skipped by
+    its worker and is not written
+    """
+    def __init__(self, path, key_cols, keys, manifest=None, source=None):
+        super().__init__(daemon=True)
+        self.path = path
+        self.key_cols = key_cols
+        self.keys = list(keys)
+        self.manifest = manifest
+        self.source = source
+        self.queue = Queue()
+        self.pending = {}
+        self.next_idx = 0
+
+    def put(self, key, df):
+        self.queue.put((key, df))
+
+    def close(self):
+        """
+        Waits for every unit to be written
+        """
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            key, df = item
+            self.pending[key] = df
+            self._flush_ready()
+
+    def _flush_ready(self):
+        batch = []
+        while self.next_idx < len(self.keys) and self.keys[self.next_idx] in self.pending:
+            key = self.keys[self.next_idx]
+            df = self.pending.pop(key)
+            self.next_idx += 1
+
+            if df is None:
+                continue
+
+            season, unit = key if isinstance(key, tuple) else (key, None)
+            if self.manifest is None or self.manifest.is_changed(self.source, season, df, unit):
+                batch.append((season, unit, df))
+
+            elif self.manifest is not None:
+                self.manifest.mark_complete(self.source, season, df, unit)
+
+        if not batch:
+            return
+
+        upsert_csv(self.path, pd.concat([df for _, _, df in batch], ignore_index=True),
+                   self.key_cols)
+
+        if self.manifest is not None:
+            for season, unit, df in batch:
+                self.manifest.mark_complete(self.source, season, df, unit)